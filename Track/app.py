@@ -1,8 +1,17 @@
-from flask import Flask, render_template, request, send_file
+from flask import Flask, render_template, request, send_file, jsonify, url_for, Response, stream_with_context
 import os
 import sys
-# Import the processing function directly
-from data_combiner import process_data_func
+import shutil
+import logging
+import threading
+from collections import deque, OrderedDict
+# Only light modules at import time: pandas/numpy (and everything that uses them:
+# data_combiner, load_index, kpis, batch) are imported inside the routes that
+# need them, so serving the upload page on a cold start doesn't load them
+import result_cache
+import jobs
+import workspaces
+import run_metrics
 
 app = Flask(__name__)
 
@@ -11,6 +20,47 @@ app = Flask(__name__)
 # unless the user wants persistence. Let's use /tmp for compatibility.
 app.config['UPLOAD_FOLDER'] = "/tmp"
 
+# Results keyed by upload contents; bounded by size and age (LRU eviction)
+app.config['RESULT_CACHE_DIR'] = os.path.join(app.config['UPLOAD_FOLDER'], "logifusion_cache")
+app.config['RESULT_CACHE_MAX_BYTES'] = 500 * 1024 * 1024
+app.config['RESULT_CACHE_MAX_AGE'] = 7 * 24 * 3600
+
+# Each run gets its own workspace for its outputs under WORKSPACE_ROOT;
+# old workspaces are removed by age, then oldest-first above the size limit
+app.config['WORKSPACE_ROOT'] = os.path.join(app.config['UPLOAD_FOLDER'], "logifusion_runs")
+app.config['WORKSPACE_MAX_AGE'] = 24 * 3600
+app.config['WORKSPACE_MAX_BYTES'] = 2 * 1024 * 1024 * 1024
+
+# Runs execute on a local worker pool; extra submissions queue up
+app.config['MAX_CONCURRENT_JOBS'] = 2
+
+# Serverless hosts (Vercel sets VERCEL) freeze background threads once the response
+# is sent, and a poll may reach another instance, so there runs finish inside the request
+app.config['SYNC_JOBS'] = bool(os.environ.get('VERCEL'))
+
+# Skip the (slow) Excel output during a run and build it on the first Excel download instead
+app.config['LAZY_XLSX'] = False
+
+# /api/loads: indexed results kept in memory (most recently used runs) and page sizes
+app.config['LOAD_INDEX_CACHE'] = 2
+app.config['API_PAGE_SIZE'] = 100
+app.config['API_MAX_PAGE_SIZE'] = 1000
+
+# /api/batch: depot folders (each holding the five files) live under BATCH_ROOT;
+# BATCH_WORKERS processes per batch (None: one per CPU)
+app.config['BATCH_ROOT'] = os.path.join(app.config['UPLOAD_FOLDER'], "logifusion_depots")
+app.config['BATCH_WORKERS'] = None
+
+# Per-run metrics kept for the /metrics aggregate (most recent runs)
+app.config['METRICS_HISTORY'] = 500
+
+# Each run's metrics are logged as one JSON line on the logifusion.metrics logger
+if not run_metrics.logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    run_metrics.logger.addHandler(handler)
+    run_metrics.logger.setLevel(logging.INFO)
+
 # Ensure the upload folder exists
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
@@ -24,62 +74,374 @@ FILE_MAPPING = {
     'file_route': '5.Time_in_Route_Information.csv'
 }
 
+# Download formats -> output format; the CSV feeds lazy Excel generation and the
+# /api/loads index (no pickles: run folders are never unpickled)
+DOWNLOAD_FORMATS = {'excel': 'xlsx', 'csv': 'csv'}
+
+# Code version for cache keys: a new deploy of the pipeline invalidates old results
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_VERSION = result_cache.source_version(
+    [os.path.join(APP_DIR, name) for name in ('data_combiner.py', 'load_store.py', 'kpis.py')])
+
+job_queue = None
+job_queue_lock = threading.Lock()
+export_lock = threading.Lock()
+metrics_history = deque(maxlen=app.config['METRICS_HISTORY'])
+load_indexes = OrderedDict()
+load_index_lock = threading.Lock()
+
+def get_job_queue():
+    # Created on first use so MAX_CONCURRENT_JOBS can be configured after import
+    global job_queue
+    with job_queue_lock:
+        if job_queue is None:
+            job_queue = jobs.JobQueue(max_workers=app.config['MAX_CONCURRENT_JOBS'])
+        return job_queue
+
+def start_job(func, *args, **fields):
+    # Queue the job, or run it to completion first when SYNC_JOBS is set
+    queue = get_job_queue()
+    if app.config['SYNC_JOBS']:
+        return queue.run(func, *args, **fields)
+    return queue.submit(func, *args, **fields)
+
+def job_response_code(job):
+    # 202 while the job is still pending; a finished (cached or synchronous) job is a plain 200
+    return 202 if job['status'] in (jobs.QUEUED, jobs.RUNNING) else 200
+
+def wants_json():
+    best = request.accept_mimetypes.best_match(['application/json', 'text/html'])
+    return best == 'application/json' or request.args.get('format') == 'json'
+
+def job_payload(job):
+    payload = dict(job)
+    payload['status_url'] = url_for('job_status', job_id=job['id'])
+    if job['status'] == jobs.DONE:
+        payload['downloads'] = {fmt: url_for('download_job_output', job_id=job['id'], fmt=fmt)
+                                for fmt in ('excel', 'csv')}
+        if job.get('depots'):
+            payload['depot_downloads'] = {
+                depot: {fmt: url_for('download_job_output', job_id=job['id'], fmt=fmt, depot=depot)
+                        for fmt in ('excel', 'csv')}
+                for depot in job['depots']}
+    return payload
+
+def run_formats():
+    return ['csv'] if app.config['LAZY_XLSX'] else ['xlsx', 'csv']
+
+def output_files():
+    # Files of a run kept in the result cache
+    from data_combiner import output_path
+    from kpis import KPI_NAME
+    return [os.path.basename(output_path('.', fmt)) for fmt in ('xlsx', 'csv')] + [KPI_NAME]
+
+def record_metrics(run_id, metrics):
+    # Log one run's metrics and keep them for /metrics
+    metrics.log(run=run_id)
+    metrics_history.append(metrics.to_dict())
+
+def run_job(workspace, uploads, key, uploaded_count, progress):
+    # Worker side of /run: combine the uploads (plain, gzip or zip CSV bytes) into the
+    # workspace and cache the result; uploads are parsed straight from memory
+    from data_combiner import process_data_func, SOURCE_FILES
+    inputs = {name: uploads[filename] for name, filename in SOURCE_FILES.items() if filename in uploads}
+    formats = run_formats()
+    metrics = run_metrics.RunMetrics()
+    try:
+        result_msg = process_data_func(workspace, progress=progress, inputs=inputs, formats=formats, metrics=metrics)
+    except Exception as e:
+        metrics.finish(f"❌ {e}")
+        record_metrics(os.path.basename(workspace), metrics)
+        raise
+    metrics.finish(result_msg)
+    record_metrics(os.path.basename(workspace), metrics)
+    if result_msg.startswith("✅"):
+        cache_dir = app.config['RESULT_CACHE_DIR']
+        result_cache.store(cache_dir, key,
+                           [os.path.join(workspace, name) for name in output_files()],
+                           result_msg)
+        result_cache.evict(cache_dir, app.config['RESULT_CACHE_MAX_BYTES'], app.config['RESULT_CACHE_MAX_AGE'])
+
+    # Add a note about uploads; the job's status comes from the combiner's own message
+    upload_note = f"\n[System] Processed {uploaded_count} news uploaded files.\n"
+    status = jobs.DONE if result_msg.startswith("✅") else jobs.FAILED
+    return upload_note + result_msg, {"status": status, "metrics": metrics.to_dict()}
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/run', methods=['POST'])
 def run_script():
-    # 1. Save uploaded files
+    # 1. Read uploaded files
     uploaded_count = 0
     try:
-        # Ensure directory exists again just in case
-        if not os.path.exists(app.config['UPLOAD_FOLDER']):
-            os.makedirs(app.config['UPLOAD_FOLDER'])
+        # Make room before starting another run; active runs are kept
+        workspaces.cleanup_workspaces(app.config['WORKSPACE_ROOT'], app.config['WORKSPACE_MAX_AGE'],
+                                      app.config['WORKSPACE_MAX_BYTES'], keep=get_job_queue().active_ids())
 
+        uploads = {}
         for field_name, target_name in FILE_MAPPING.items():
             if field_name in request.files:
                 file = request.files[field_name]
                 if file and file.filename != '':
-                    save_path = os.path.join(app.config['UPLOAD_FOLDER'], target_name)
-                    file.save(save_path)
+                    uploads[target_name] = file.read()
                     uploaded_count += 1
-        
-        # 2. Run the combiner logic directly
-        try:
-            # Capture output by intercepting stdout? Or just trust the return message.
-            # The refactored function returns a status string.
-            # If we really want stdout, we'd have to redirect it, but return message is safer.
-            result_msg = process_data_func(app.config['UPLOAD_FOLDER'])
-            output = result_msg
-            
-            # Add a note about uploads
-            upload_note = f"\n[System] Processed {uploaded_count} news uploaded files.\n"
-            output = upload_note + output
-            
-        except Exception as e:
-            output = f"Critical Error running script: {str(e)}"
-            import traceback
-            traceback.print_exc()
-
-        return render_template('result.html', output=output)
+
+        # A run only sees its own uploads
+        digests = {target_name: result_cache.file_digest(data=uploads[target_name]) if target_name in uploads else None
+                   for target_name in FILE_MAPPING.values()}
+        key = result_cache.cache_key(digests, PIPELINE_VERSION)
+        run_id, workspace = workspaces.create_workspace(app.config['WORKSPACE_ROOT'])
+
+        # 2. Serve a previous result for identical inputs
+        cache_dir = app.config['RESULT_CACHE_DIR']
+        entry, cached_status = result_cache.lookup(cache_dir, key)
+        if entry:
+            for name in output_files():
+                if os.path.exists(os.path.join(entry, name)):
+                    shutil.copy2(os.path.join(entry, name), os.path.join(workspace, name))
+            output = "\n[System] Identical files processed before; served cached result.\n" + cached_status
+            metrics_history.append({"cached": True})
+            job_id = get_job_queue().add_finished(output, id=run_id, output_dir=workspace)
+        else:
+            # 3. Queue the combiner run in its workspace; the page polls /jobs/<id>
+            job_id = start_job(run_job, workspace, uploads, key, uploaded_count,
+                               id=run_id, output_dir=workspace)
+
+        job = get_job_queue().get(job_id)
+        if wants_json():
+            return jsonify(job_payload(job)), job_response_code(job)
+        return render_template('result.html', job=job)
 
     except Exception as e:
         return f"Error handling request: {e}", 500
 
-@app.route('/download/excel')
-def download_excel():
-    path = os.path.join(app.config['UPLOAD_FOLDER'], 'Final_Consolidated_Data_Complete.xlsx')
-    if os.path.exists(path):
+def batch_folder(name):
+    # A folder under BATCH_ROOT; anything resolving outside it is rejected
+    root = os.path.realpath(app.config['BATCH_ROOT'])
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        raise ValueError(f"Unknown depot folder {name!r}")
+    return path
+
+def run_batch_job(workspace, folders, progress):
+    # Worker side of /api/batch: per-depot outputs in workspace/<depot>, combined in workspace
+    import batch
+    result = batch.run_batch(list(folders), workspace, workers=app.config['BATCH_WORKERS'],
+                             formats=run_formats(), progress=progress)
+    statuses = {folders[path]: status for path, status in result['folders'].items()}
+    return result['status'], {"depots": result['depots'], "folders": statuses}
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    # JSON {"folders": [...]} and/or {"manifest": "..."}, relative to BATCH_ROOT
+    import batch
+    body = request.get_json(silent=True) or {}
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        names = body.get('folders') or []
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError("'folders' must be a list of folder names")
+        if not isinstance(body.get('manifest') or "", str):
+            raise ValueError("'manifest' must be a file name")
+        names = list(names)
+        if body.get('manifest'):
+            manifest = batch_folder(os.path.dirname(body['manifest']) or '.')
+            manifest = os.path.join(manifest, os.path.basename(body['manifest']))
+            if not os.path.isfile(manifest):
+                raise ValueError(f"Unknown manifest {body['manifest']!r}")
+            names += [os.path.relpath(path, app.config['BATCH_ROOT']) for path in batch.read_manifest(manifest)]
+        if not names:
+            raise ValueError("Give depot folders or a manifest")
+        folders = {batch_folder(name): name for name in names}
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    workspaces.cleanup_workspaces(app.config['WORKSPACE_ROOT'], app.config['WORKSPACE_MAX_AGE'],
+                                  app.config['WORKSPACE_MAX_BYTES'], keep=get_job_queue().active_ids())
+    run_id, workspace = workspaces.create_workspace(app.config['WORKSPACE_ROOT'])
+    job_id = start_job(run_batch_job, workspace, folders, id=run_id, output_dir=workspace)
+    job = get_job_queue().get(job_id)
+    return jsonify(job_payload(job)), job_response_code(job)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_payload(job))
+
+@app.route('/metrics')
+def metrics():
+    # Aggregate stage timings, memory and fill hit rates over recent runs
+    return jsonify(run_metrics.aggregate(list(metrics_history)))
+
+def run_folder(run_id):
+    # Output folder of a run (None if unknown) and the status of its job, if still tracked;
+    # without a run ID, the most recent completed run
+    if run_id:
+        job = get_job_queue().get(run_id)
+        folder = job['output_dir'] if job else workspaces.workspace_path(app.config['WORKSPACE_ROOT'], run_id)
+    else:
+        job = get_job_queue().latest()
+        folder = job['output_dir'] if job else None
+    return folder, job['status'] if job else None
+
+def send_output(run_id, fmt, depot=None):
+    # Serve one output of a run (or of one depot of a batch run); without a run ID,
+    # the most recent completed run
+    from data_combiner import output_path, export_output
+    if fmt not in DOWNLOAD_FORMATS:
+        return "Unknown format.", 404
+
+    folder, status = run_folder(run_id)
+    if status not in (None, jobs.DONE):
+        return f"Job is {status}; try again when it is done.", 409
+    if depot:
+        folder = workspaces.workspace_path(folder, depot) if folder else None
+
+    path = output_path(folder, DOWNLOAD_FORMATS[fmt]) if folder else None
+    if path and not os.path.exists(path) and os.path.exists(output_path(folder, 'csv')):
+        # Lazily generated output: build it once, later downloads reuse the file
+        with export_lock:
+            if not os.path.exists(path):
+                export_output(folder, DOWNLOAD_FORMATS[fmt])
+    if path and os.path.exists(path):
         return send_file(path, as_attachment=True)
     return "File not found. Please run the script first.", 404
 
+@app.route('/jobs/<job_id>/download/<fmt>')
+def download_job_output(job_id, fmt):
+    return send_output(job_id, fmt, request.args.get('depot'))
+
+@app.route('/download/excel')
+def download_excel():
+    return send_output(request.args.get('run'), 'excel')
+
 @app.route('/download/csv')
 def download_csv():
-    path = os.path.join(app.config['UPLOAD_FOLDER'], 'Final_Consolidated_Data_Complete.csv')
-    if os.path.exists(path):
-        return send_file(path, as_attachment=True)
-    return "File not found. Please run the script first.", 404
+    return send_output(request.args.get('run'), 'csv')
+
+def get_load_index(folder):
+    # Built once per run result and reused; the least recently used index is dropped
+    from data_combiner import output_path, read_output
+    import load_index
+    version = os.path.getmtime(output_path(folder, 'csv'))
+    with load_index_lock:
+        cached = load_indexes.get(folder)
+        if cached and cached[0] == version:
+            load_indexes.move_to_end(folder)
+            return cached[1]
+        index = load_index.LoadIndex(read_output(folder))
+        load_indexes[folder] = (version, index)
+        while len(load_indexes) > app.config['LOAD_INDEX_CACHE']:
+            load_indexes.popitem(last=False)
+        return index
+
+def api_index():
+    # Index of ?run=<id> (default: the most recent completed run), or an error response
+    from data_combiner import output_path
+    folder, status = run_folder(request.args.get('run'))
+    if status not in (None, jobs.DONE):
+        return None, (jsonify({"error": f"Job is {status}; try again when it is done."}), 409)
+    if not folder or not os.path.exists(output_path(folder, 'csv')):
+        return None, (jsonify({"error": "No results found. Please run the script first."}), 404)
+    return get_load_index(folder), None
+
+def query_date(name, end=False):
+    # from/to as a date or datetime; a date-only `to` covers that whole day
+    import pandas as pd
+    value = request.args.get(name)
+    if not value:
+        return None
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is not None:
+        stamp = stamp.tz_localize(None)
+    if end and stamp == stamp.normalize() and len(value.strip()) <= 10:
+        stamp += pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+    return stamp
+
+@app.route('/api/loads/<load_number>')
+def api_load(load_number):
+    index, error = api_index()
+    if error:
+        return error
+    record = index.get(load_number)
+    if record is None:
+        return jsonify({"error": f"Load {load_number} not found"}), 404
+    from load_index import dumps
+    return Response(dumps(record), mimetype='application/json')
+
+@app.route('/api/loads')
+def api_loads():
+    # Filter by driver, customer, vehicle and Create Date range; results in date order, paged
+    index, error = api_index()
+    if error:
+        return error
+    try:
+        start, end = query_date('from'), query_date('to', end=True)
+        page = int(request.args.get('page', 1))
+        per_page = min(int(request.args.get('per_page', app.config['API_PAGE_SIZE'])), app.config['API_MAX_PAGE_SIZE'])
+        if page < 1 or per_page < 1:
+            raise ValueError("page and per_page must be positive")
+    except ValueError as e:
+        return jsonify({"error": f"Bad query: {e}"}), 400
+
+    from load_index import FILTER_COLUMNS
+    filters = {key: request.args.get(key) for key in FILTER_COLUMNS}
+    matches = index.query(start=start, end=end, **filters)
+    positions = matches[(page - 1) * per_page:page * per_page]
+    meta = {"total": len(matches), "page": page, "per_page": per_page,
+            "pages": -(-len(matches) // per_page)}
+    return Response(stream_with_context(index.stream_page(positions, meta)), mimetype='application/json')
+
+def load_kpis(run_id):
+    # KPI rollup of a run (default: the most recent completed run) as records, or an error
+    import kpis
+    folder, status = run_folder(run_id)
+    if status not in (None, jobs.DONE):
+        return None, (f"Job is {status}; try again when it is done.", 409)
+    path = os.path.join(folder, kpis.KPI_NAME) if folder else None
+    if not path or not os.path.exists(path):
+        return None, ("No KPI summary found. Please run the script first.", 404)
+    table = kpis.read_kpis(path)
+    return table.astype(object).where(table.notna(), None), None
+
+@app.route('/api/kpis')
+def api_kpis():
+    # Rollup rows, optionally for one dimension and/or measure
+    import kpis
+    table, error = load_kpis(request.args.get('run'))
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    for key in ('dimension', 'measure'):
+        value = request.args.get(key)
+        if value:
+            table = table[table[key] == value]
+    return jsonify({"dimensions": list(kpis.KPI_DIMENSIONS), "measures": kpis.KPI_MEASURES,
+                    "kpis": table.to_dict('records')})
+
+@app.route('/kpis')
+def kpi_summary():
+    import pandas as pd
+    import kpis
+    run_id = request.args.get('run')
+    table, error = load_kpis(run_id)
+    if error:
+        return error
+    dimension = request.args.get('dimension', 'driver')
+    measure = request.args.get('measure', kpis.KPI_MEASURES[0])
+    if dimension not in kpis.KPI_DIMENSIONS or measure not in kpis.KPI_MEASURES:
+        return "Unknown dimension or measure.", 404
+    rows = table[(table['dimension'] == dimension) & (table['measure'] == measure)]
+    if dimension == 'month':
+        rows = rows.sort_values('value', key=lambda v: pd.to_datetime(v, format='%B', errors='coerce'))
+    else:
+        rows = rows.sort_values('count', ascending=False, kind='stable')
+    return render_template('kpis.html', rows=rows.to_dict('records'), run_id=run_id, dimension=dimension,
+                           measure=measure, dimensions=list(kpis.KPI_DIMENSIONS), measures=kpis.KPI_MEASURES)
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,117 @@
+import os
+import io
+import re
+import json
+import shutil
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_combiner import (process_data_func, get_file_paths, read_snapshot, resolve_formats, write_outputs,
+                           concat_typed, sort_by_month, report, DEFAULT_FORMATS, OUTPUT_FORMATS)
+import kpis
+
+# --- Multi-Depot Batch ---
+# Runs the combiner over many folders of the five exports (typically one per
+# depot) in a process pool, then writes the combined output of all of them plus
+# one output per depot, named from the data's Mwarehouse (Depot) values.
+
+def read_manifest(path):
+    # A JSON list of folders (strings or {"dir": ...}) or one folder per line;
+    # relative folders are taken from the manifest's own folder
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        entries = [e["dir"] if isinstance(e, dict) else e for e in json.loads(text)]
+    else:
+        entries = [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+    return [os.path.join(base, entry) for entry in entries]
+
+def depot_folder(depot):
+    # Output folder name for a depot value; anything path-like is flattened
+    name = re.sub(r"[^\w.-]+", "_", str(depot)).strip("._")
+    return name or "unknown"
+
+def combine_folder(folder, work_dir):
+    # Worker: one pipeline run over a folder, its result left as a pickle in work_dir
+    # (a private temporary folder of run_batch)
+    os.makedirs(work_dir, exist_ok=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return process_data_func(work_dir, inputs=get_file_paths(folder), formats=["pickle"])
+
+def write_result(df, out_dir, formats):
+    os.makedirs(out_dir, exist_ok=True)
+    write_outputs(df, out_dir, formats)
+    kpis.write_kpis(kpis.compute_kpis(df), os.path.join(out_dir, kpis.KPI_NAME))
+
+def run_batch(folders, out_dir, workers=None, formats=None, progress=None):
+    # Returns {"status", "folders": {folder: status}, "depots": {folder name: loads}, "loads"};
+    # the combined output goes to out_dir and each depot's to out_dir/<depot>
+    formats = resolve_formats(formats)
+    folders = list(dict.fromkeys(folders))
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(len(folders), workers or os.cpu_count() or 1))
+    print(f"📦 Batch of {len(folders)} folders on {workers} workers...")
+
+    # A missing folder fails on its own, like any other folder that can't be combined
+    statuses = {folder: f"❌ Not a folder: {folder}" for folder in folders if not os.path.isdir(folder)}
+    for folder in statuses:
+        print(f"❌ {folder}: Not a folder")
+    work_root = tempfile.mkdtemp(prefix=".batch-", dir=out_dir)
+    try:
+        work_dirs = [os.path.join(work_root, str(i)) for i in range(len(folders))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(combine_folder, folder, work_dir): folder
+                       for folder, work_dir in zip(folders, work_dirs) if folder not in statuses}
+            for done, future in enumerate(as_completed(futures), 1):
+                folder = futures[future]
+                try:
+                    statuses[folder] = future.result()
+                except Exception as e:
+                    statuses[folder] = f"❌ Error processing {folder}: {e}"
+                print(f"{statuses[folder][:1]} {folder}: {statuses[folder][1:].strip()}")
+                report(progress, f"folders {done}/{len(futures)}")
+
+        # Combined in the order the folders were given
+        frames = [read_snapshot(work_dir) for folder, work_dir in zip(folders, work_dirs)
+                  if statuses[folder].startswith("✅")]
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    if not frames:
+        return {"status": "❌ No data processed! Please ensure CSV files are present.",
+                "folders": statuses, "depots": {}, "loads": 0}
+
+    report(progress, "saving")
+    combined = sort_by_month(concat_typed(frames))
+    depots = {}
+    for depot, df in combined.groupby(combined['Mwarehouse'].astype(object).fillna(""), sort=True):
+        name = depot_folder(depot)
+        print(f"💾 Saving {len(df)} records for depot {name}...")
+        write_result(df, os.path.join(out_dir, name), formats)
+        depots[name] = len(df)
+    print(f"💾 Saving {len(combined)} combined records...")
+    write_result(combined, out_dir, formats)
+
+    failed = [folder for folder, status in statuses.items() if not status.startswith("✅")]
+    status = (f"✅ Done! {len(depots)} depots from {len(folders) - len(failed)} folders saved successfully."
+              + (f" {len(failed)} folders failed." if failed else ""))
+    return {"status": status, "folders": statuses, "depots": depots, "loads": len(combined)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combine several depot folders concurrently into per-depot and combined outputs.")
+    parser.add_argument("folders", nargs="*", help="folders holding the five CSV files, one per depot")
+    parser.add_argument("--manifest", help="file listing the folders (JSON list or one per line)")
+    parser.add_argument("--out", default="batch_output", help="output folder (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="parallel processes (default: one per CPU)")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"comma-separated output formats out of {', '.join(OUTPUT_FORMATS)} (default: %(default)s)")
+    args = parser.parse_args()
+
+    folders = list(args.folders) + (read_manifest(args.manifest) if args.manifest else [])
+    if not folders:
+        parser.error("give depot folders or --manifest")
+    result = run_batch(folders, args.out, workers=args.workers,
+                       formats=[f.strip() for f in args.formats.split(",") if f.strip()])
+    print(result["status"])
@@ -0,0 +1,176 @@
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from data_combiner import process_data_func, SOURCE_FILES
+from run_metrics import RunMetrics, peak_rss_mb
+import synthetic_data
+import input_cache
+
+# --- Benchmark ---
+# Times each stage of process_data_func on synthetic inputs of increasing size
+# and compares the results with a saved baseline to catch regressions. Each size
+# runs in a fresh process so its peak RSS is its own.
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(APP_DIR, "benchmark_baseline.json")
+# Cold imports timed in a fresh interpreter: the web app (what a cold start pays
+# before serving anything) and the pipeline itself
+IMPORT_MODULES = ["app", "data_combiner"]
+IMPORT_SCRIPT = ("import sys, time; start = time.perf_counter(); import {module}; "
+                 "print(time.perf_counter() - start, 'pandas' in sys.modules)")
+
+def dataset(data_dir, loads, seed):
+    # Generated once per size and seed, reused by later runs
+    folder = os.path.join(data_dir, f"loads_{loads}_seed_{seed}")
+    if not all(os.path.exists(os.path.join(folder, name)) for name in SOURCE_FILES.values()):
+        print(f"🧪 Generating {loads} synthetic loads in {folder}...")
+        synthetic_data.generate(folder, loads, seed=seed)
+    return folder
+
+def run_once(folder, loads, formats, trace_memory=False, **options):
+    metrics = RunMetrics()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        status = process_data_func(folder, metrics=metrics, formats=formats, **options)
+    end = time.perf_counter()
+    metrics.finish(status)
+    traced = None
+    if trace_memory:
+        traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    rss = peak_rss_mb()
+    if not status.startswith("✅"):
+        raise RuntimeError(status)
+
+    total = end - start
+    return {
+        "loads": loads,
+        "total_s": round(total, 3),
+        "loads_per_s": round(loads / total, 1),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        "peak_traced_mb": round(traced, 1) if traced is not None else None,
+        "stages_s": {s["stage"]: s["seconds"] for s in metrics.to_dict()["stages"]},
+    }
+
+def import_time(module, repeat):
+    # Fastest of repeat cold imports, and whether the import pulled in pandas
+    runs = []
+    for _ in range(max(1, repeat)):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT.format(module=module)], cwd=APP_DIR,
+                             capture_output=True, text=True, check=True).stdout.split()
+        runs.append((float(out[-2]), out[-1] == "True"))
+    seconds, pandas_loaded = min(runs)
+    return {"import_s": round(seconds, 3), "loads_pandas": pandas_loaded}
+
+def run_isolated(*args, **kwargs):
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run_once, *args, **kwargs).result()
+
+def compare(results, baseline, tolerance):
+    # Regressions: total time or peak memory above baseline by more than tolerance
+    problems = []
+    for size, result in results.items():
+        base = baseline.get("results", {}).get(size)
+        if not base:
+            continue
+        for key in ("total_s", "peak_rss_mb", "peak_traced_mb"):
+            if result.get(key) is None or base.get(key) is None:
+                continue
+            limit = base[key] * (1 + tolerance)
+            if result[key] > limit:
+                problems.append(f"{size} loads: {key} {result[key]} > baseline {base[key]} (+{tolerance:.0%})")
+    return problems
+
+def compare_imports(imports, baseline, tolerance):
+    # Regressions: a slower cold import, or one that now loads pandas
+    problems = []
+    for module, result in imports.items():
+        base = baseline.get("imports", {}).get(module)
+        if not base:
+            continue
+        if result["import_s"] > base["import_s"] * (1 + tolerance):
+            problems.append(f"import {module}: {result['import_s']}s > baseline {base['import_s']}s (+{tolerance:.0%})")
+        if result["loads_pandas"] and not base["loads_pandas"]:
+            problems.append(f"import {module}: now loads pandas")
+    return problems
+
+def print_result(result):
+    memory = [f"{result['peak_rss_mb']} MB peak RSS" if result['peak_rss_mb'] is not None else "RSS unavailable"]
+    if result['peak_traced_mb'] is not None:
+        memory.append(f"{result['peak_traced_mb']} MB traced")
+    print(f"⏱️ {result['loads']} loads: {result['total_s']}s ({result['loads_per_s']} loads/s), {', '.join(memory)}")
+    for stage, seconds in result["stages_s"].items():
+        print(f"    {stage:<14} {seconds:8.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the combiner on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of loads to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "logifusion_bench"),
+                        help="where generated inputs are kept between runs")
+    parser.add_argument("--formats", default="csv", help="output formats to write (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="pass workers to process_data_func")
+    parser.add_argument("--chunksize", type=int, help="pass chunksize to process_data_func")
+    parser.add_argument("--input-cache", action="store_true",
+                        help="read the inputs through the parsed-input cache (the first run fills it, so this times reruns)")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also report the traced Python heap peak (several times slower, so timings are not comparable)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the fastest is kept (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (default: 0.2)")
+    args = parser.parse_args()
+
+    options = {key: value for key, value in (("workers", args.workers), ("chunksize", args.chunksize)) if value}
+    if args.input_cache:
+        options["input_cache_dir"] = input_cache.default_cache_dir()
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+
+    imports = {module: import_time(module, args.repeat) for module in IMPORT_MODULES}
+    for module, result in imports.items():
+        print(f"⏱️ import {module}: {result['import_s']}s{' (loads pandas)' if result['loads_pandas'] else ''}")
+
+    results = {}
+    for loads in args.sizes:
+        folder = dataset(args.data_dir, loads, args.seed)
+        runs = [run_isolated(folder, loads, formats, trace_memory=args.tracemalloc, **options)
+                for _ in range(max(1, args.repeat))]
+        results[str(loads)] = min(runs, key=lambda run: run["total_s"])
+        print_result(results[str(loads)])
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "options": {"formats": formats, "tracemalloc": args.tracemalloc, "repeat": args.repeat, **options},
+        "imports": imports,
+        "results": results,
+    }
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("options") != report["options"]:
+            print(f"⚠️ Baseline was recorded with different options: {baseline.get('options')}")
+        problems = compare_imports(imports, baseline, args.tolerance) + compare(results, baseline, args.tolerance)
+        if problems:
+            print("❌ Regressions against baseline:")
+            for problem in problems:
+                print(f"    {problem}")
+            sys.exit(1)
+        print("✅ No regressions against baseline.")
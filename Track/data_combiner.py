@@ -1,19 +1,43 @@
 import pandas as pd
 import os
+import argparse
+import json
+import io
+import gzip
+import codecs
+import zipfile
+import contextlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
-import statistics
-from datetime import datetime
+import load_store
+import run_metrics
+import input_cache
+import kpis
 
 # --- Configuration & Constants ---
 # Wrappers to allow dynamic paths
+SOURCE_FILES = {
+    "Depot": "1.Depot_Departures.csv",
+    "Customer": "2.Customer_Timestamps.csv",
+    "Distance": "3.Distance_Information.csv",
+    "Timestamps": "4.Timestamps_and_Duration.csv",
+    "TimeRoute": "5.Time_in_Route_Information.csv"
+}
+
+# Compressed copies (e.g. 1.Depot_Departures.csv.gz) are picked up when the plain CSV is absent
+COMPRESSED_SUFFIXES = ['.gz', '.zip']
+
 def get_file_paths(base_dir='.'):
-    return {
-        "Depot": os.path.join(base_dir, "1.Depot_Departures.csv"),
-        "Customer": os.path.join(base_dir, "2.Customer_Timestamps.csv"),
-        "Distance": os.path.join(base_dir, "3.Distance_Information.csv"),
-        "Timestamps": os.path.join(base_dir, "4.Timestamps_and_Duration.csv"),
-        "TimeRoute": os.path.join(base_dir, "5.Time_in_Route_Information.csv")
-    }
+    paths = {}
+    for name, filename in SOURCE_FILES.items():
+        path = os.path.join(base_dir, filename)
+        for candidate in [path] + [path + suffix for suffix in COMPRESSED_SUFFIXES]:
+            if os.path.exists(candidate):
+                path = candidate
+                break
+        paths[name] = path
+    return paths
 
 COLUMNS = [
     "Create Date", "Month Name", "Transporter", "Load Number", "Mode Of Capture", "Driver Name",
@@ -27,447 +51,1191 @@ COLUMNS = [
     "Comment Ave Tir"
 ]
 
+# Timestamp columns carried as datetime64 through the pipeline
+DATETIME_COLUMNS = [
+    "Create Date", "Clockin Time", "Planned Departure Time", "Dj Departure Time",
+    "Arrival At Customer", "Departure Time From Customer", "Arrival At Depot", "Clock Out"
+]
+
+# Explicit, day-first formats seen in the exports (ISO for the Distance file)
+DATETIME_FORMATS = [
+    '%d/%m/%Y %H:%M', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M', '%d/%m/%Y', '%Y-%m-%d'
+]
+
+# Written back in the exports' own layout
+DATETIME_OUTPUT_FORMAT = '%d/%m/%Y %H:%M'
+EXCEL_DATETIME_FORMAT = 'DD/MM/YYYY HH:MM'
+
+# Column dtypes: labels that repeat across loads are categorical, measures are
+# nullable numbers, timestamps datetime64; anything else stays plain text.
+# "int" columns are Int64 unless a value has a fraction (then Float64).
+CATEGORY_COLUMNS = [
+    "Month Name", "Transporter", "Mode Of Capture", "Driver Name", "Vehicle Reg", "Customer Name",
+    "Mwarehouse", "Comment", "Ave Departure", "Comment Ave Departure", "Comment Tat",
+    "Ave Arrival Time", "Comment Ave Arrival Time", "Comment Ave Tir"
+]
+FLOAT_COLUMNS = [
+    "Vol Hl", "Budgeted Kms", "PlannedDistanceToCustomer", "Actual Km", "Km Deviation",
+    "Actual Days In Route", "Bud Days In Route", "Days In Route Deviation", "Total Hour Route",
+    "Driver Rest Hours In Route", "Total Wh", "Tlp", "D1", "D2", "D3", "D4"
+]
+INT_COLUMNS = ["Departure Deviation Min", "Service Time At Customer"]
+# Float columns whose whole values are written as integers (the exports give whole km)
+WHOLE_NUMBER_COLUMNS = ["Actual Km"]
+
+SCHEMA = {col: "text" for col in COLUMNS}
+SCHEMA.update({col: "category" for col in CATEGORY_COLUMNS})
+SCHEMA.update({col: "float" for col in FLOAT_COLUMNS})
+SCHEMA.update({col: "int" for col in INT_COLUMNS})
+SCHEMA.update({col: "datetime" for col in DATETIME_COLUMNS})
+
 # --- Helper Functions ---
 
-def extract_month_name(date_str):
-    if pd.isna(date_str) or date_str == "":
-        return ""
-    try:
-        if isinstance(date_str, str):
-            if '/' in date_str:
-                date_part = date_str.split(' ')[0]
-                date_obj = pd.to_datetime(date_part, format='%d/%m/%Y', errors='coerce')
-            else:
-                date_obj = pd.to_datetime(date_str, errors='coerce')
+# Formats that matched per column, tried first on the next parse
+_format_cache = {}
+
+def parse_datetimes(series, cache_key=None):
+    # Parse a whole column at once: each distinct string is parsed a single time,
+    # against explicit formats only (no per-cell inference)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    text = text_values(series).where(series.notna())
+    uniques = pd.Series(text.dropna().unique(), dtype=object)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+
+    known = _format_cache.get(cache_key, [])
+    formats = known + [fmt for fmt in DATETIME_FORMATS if fmt not in known]
+    remaining = uniques.index
+    for fmt in formats:
+        if remaining.empty:
+            break
+        attempt = pd.to_datetime(uniques[remaining], format=fmt, errors='coerce')
+        hit = attempt.notna()
+        if hit.any():
+            parsed[remaining[hit]] = attempt[hit]
+            remaining = remaining[~hit]
+            if cache_key is not None and fmt not in known:
+                known.append(fmt)
+    if cache_key is not None:
+        _format_cache[cache_key] = known
+
+    if uniques.empty:
+        return pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    return text.map(pd.Series(parsed.values, index=uniques.values)).astype('datetime64[ns]')
+
+# --- Schema ---
+
+def blank_to_na(series):
+    return series.where(~series.isin([""]))
+
+def to_numbers(series):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series
+    return pd.to_numeric(blank_to_na(series.astype(object)), errors='coerce')
+
+def apply_schema(df):
+    # Cast the schema columns present in df to their dtype; blanks ("") become NA
+    for col in df.columns:
+        kind = SCHEMA.get(col)
+        series = df[col]
+        if kind == "category":
+            df[col] = blank_to_na(series.astype(object)).astype('category')
+        elif kind in ("float", "int"):
+            numbers = to_numbers(series)
+            whole = kind == "int" and bool((numbers.dropna() % 1 == 0).all())
+            df[col] = numbers.astype('Int64' if whole else 'Float64')
+        elif kind == "datetime":
+            df[col] = parse_datetimes(series)
+    return df
+
+def concat_typed(dfs):
+    # pd.concat only keeps a categorical column when every frame shares its categories
+    dfs = list(dfs)
+    for col in CATEGORY_COLUMNS:
+        typed = [df for df in dfs if isinstance(df[col].dtype, pd.CategoricalDtype)] if dfs else []
+        if typed and len(typed) == len(dfs):
+            categories = pd.Index(pd.concat([pd.Series(df[col].cat.categories, dtype=object) for df in typed]).unique())
+            for df in dfs:
+                df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(dfs, ignore_index=True)
+
+def set_values(series, mask, values):
+    # Series.mask that also accepts new labels on categorical columns
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        new = pd.Index(pd.Series(values, index=series.index)[mask].dropna().unique()).difference(series.cat.categories)
+        if len(new):
+            series = series.cat.add_categories(new)
+    return series.mask(mask, values)
+
+def memory_report(df, stage, metrics=None):
+    # Rows and deep memory use of the working frame after a stage
+    mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+    print(f"📊 {stage}: {len(df)} rows, {mb:.1f} MB")
+    run_metrics.record(metrics, rows_out=len(df), frame_mb=mb)
+
+# A source is a file path, raw bytes (e.g. an upload) or a readable file object;
+# gzip and zip compression is detected from the magic bytes, not the file name.
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+def as_source(source):
+    # File objects can only be read once; keep their bytes so the source can be reopened
+    if hasattr(source, 'read'):
+        return source.read()
+    return source
+
+def source_exists(source):
+    if isinstance(source, (bytes, bytearray)):
+        return len(source) > 0
+    return source is not None and os.path.exists(source)
+
+def source_label(name, source):
+    return source if isinstance(source, str) else f"{name} (uploaded)"
+
+def zip_member(archive):
+    # The first CSV in the archive, else its first file
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    csvs = [n for n in names if n.lower().endswith('.csv')]
+    if not names:
+        raise ValueError("empty zip archive")
+    return (csvs or names)[0]
+
+@contextlib.contextmanager
+def open_source(source):
+    # Fresh binary stream over the (decompressed) CSV text
+    with contextlib.ExitStack() as stack:
+        if isinstance(source, (bytes, bytearray)):
+            raw = io.BytesIO(source)
         else:
-            date_obj = pd.to_datetime(date_str, errors='coerce')
-        
-        if pd.notna(date_obj):
-            return date_obj.strftime('%B')
-    except:
-        pass
-    return ""
-
-def load_csv(file_path, sep=None):
-    if not os.path.exists(file_path):
+            raw = stack.enter_context(open(source, 'rb'))
+        magic = raw.read(4)
+        raw.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            stream = stack.enter_context(gzip.GzipFile(fileobj=raw))
+        elif magic == ZIP_MAGIC:
+            archive = stack.enter_context(zipfile.ZipFile(raw))
+            stream = stack.enter_context(archive.open(zip_member(archive)))
+        else:
+            stream = raw
+        yield stream
+
+def sniff_csv(source, sample_size=64 * 1024):
+    # Peek at the first bytes to pick the encoding (BOM) and delimiter up front,
+    # so each file is parsed exactly once.
+    with open_source(source) as f:
+        head = f.read(sample_size)
+    encoding = 'utf-8-sig' if head.startswith(codecs.BOM_UTF8) else 'utf-8'
+    header = head.split(b'\n', 1)[0]
+    sep = '\t' if header.count(b'\t') > header.count(b',') else ','
+    return encoding, sep
+
+def read_source(source, sep=None, chunksize=None):
+    # Yields the whole frame, or one frame per chunk with chunksize
+    encoding, sniffed_sep = sniff_csv(source)
+    engines = [
+        # C engine; round_trip keeps floats identical to the old python engine parse
+        dict(sep=sep or sniffed_sep, encoding=encoding, engine='c', float_precision='round_trip', low_memory=False),
+        # Fallback to the tolerant python engine
+        dict(sep=sep, encoding='utf-8-sig', engine='python'),
+    ]
+    started = False
+    for attempt, options in enumerate(engines):
+        try:
+            with open_source(source) as f:
+                if chunksize is None:
+                    frame = pd.read_csv(f, **options)
+                    started = True
+                    yield frame
+                else:
+                    with pd.read_csv(f, chunksize=chunksize, **options) as reader:
+                        for chunk in reader:
+                            started = True
+                            yield chunk
+            return
+        except Exception:
+            # Once rows have been handed out, retrying would repeat them
+            if started or attempt == len(engines) - 1:
+                raise
+
+def load_csv(source, sep=None):
+    if not source_exists(source):
         # Silent fail or log?
         return None
     try:
-        # Try default comma
-        df = pd.read_csv(file_path, encoding='utf-8', engine='python', sep=sep if sep else ',')
-        # If one column and no sep specified, try tab
-        if sep is None and len(df.columns) <= 1:
-            df = pd.read_csv(file_path, sep='\t', encoding='utf-8', engine='python')
+        return next(read_source(source, sep=sep))
+    except Exception as e:
+        print(f"❌ Error reading {source_label('input', source)}: {e}")
+        return None
+
+def load_cached_csv(source, cache_dir):
+    # Files on disk go through the parsed-input cache; uploads are always parsed
+    if not cache_dir or not isinstance(source, str) or not source_exists(source):
+        return load_csv(source)
+    version = input_cache.cache_version(os.path.abspath(__file__))
+    df = input_cache.lookup(cache_dir, source, version)
+    if df is not None:
+        print(f"⚡ Loaded {source} from the parsed-input cache")
         return df
+    df = load_csv(source)
+    if df is not None:
+        input_cache.store(cache_dir, source, df, version)
+    return df
+
+def load_sources(input_files, cache_dir=None):
+    # Parse every source once; the same frames feed the lookups and the mappers.
+    # With cache_dir, unchanged files are loaded from the parsed-input cache.
+    print("📥 Reading input files...")
+    return {name: load_cached_csv(source, cache_dir) for name, source in input_files.items()}
+
+def count_rows(frames):
+    return sum(len(df) for df in frames.values() if df is not None)
+
+def iter_chunks(source, chunksize):
+    if not source_exists(source):
+        return
+    try:
+        yield from read_source(source, chunksize=chunksize)
     except Exception as e:
-        # Fallback to tab
-        try:
-             df = pd.read_csv(file_path, sep='\t', encoding='utf-8', engine='python')
-             return df
-        except Exception as e2:
-            print(f"❌ Error reading {file_path}: {e}")
-            return None
+        print(f"❌ Error reading {source_label('input', source)}: {e}")
+
+def estimate_chunksize(input_files, max_memory, sample_rows=1000):
+    # Rows per chunk so that a chunk and its mapped/consolidated copies stay
+    # within max_memory (MB). Sized from the widest source.
+    bytes_per_row = 1
+    for source in input_files.values():
+        chunks = iter_chunks(source, sample_rows)
+        chunk = next(chunks, None)
+        chunks.close()
+        if chunk is not None and len(chunk):
+            bytes_per_row = max(bytes_per_row, chunk.memory_usage(deep=True).sum() / len(chunk))
+    # Raw chunk + mapped frame + per-chunk consolidation, with headroom
+    working_copies = 4
+    return max(sample_rows, int(max_memory * 1024 * 1024 / (bytes_per_row * working_copies)))
 
 # --- Lookup Builders ---
 
-def build_lookups(input_files):
-    print("🔄 Building data lookups for cross-referencing...")
-    
+# Sources whose rows name their depot in a "Depot" column
+DEPOT_SOURCES = ["Depot", "Customer", "Distance", "Timestamps"]
+
+# (load col, driver col, vehicle col, transporter col) per source, in the order
+# the driver/vehicle lookups are fed.
+DRIVER_SOURCES = {
+    "Depot": ("Load Name", "Driver Name", "Vehicle Reg", "Hired/Own"),
+    "Customer": ("load_name", "DriverName", None, None),
+    "Distance": ("Load Name", "Driver Name", "Vehicle Reg", "Hired/Own"),
+    "TimeRoute": ("Load", "Driver", None, None),
+}
+
+def text_values(series):
+    # Column-wise equivalent of str(value).strip()
+    values = series.to_numpy(dtype=object).astype(str)
+    return pd.Series(values, index=series.index, dtype=object).str.strip()
+
+def blank_text(series):
+    # text_values with missing values as "" rather than "nan"
+    return text_values(series).where(series.notna(), "")
+
+def numeric_column(df, col):
+    if col is None or col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return to_numbers(df[col])
+
+def text_column(df, col):
+    # Column-wise equivalent of str(row.get(col, '')).strip()
+    if col is None or col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return text_values(df[col])
+
+def last_by_key(keys, values):
+    # dict of key -> value where later rows win, like repeated dict assignment
+    pairs = pd.DataFrame({'key': keys, 'value': values}).drop_duplicates('key', keep='last')
+    return dict(zip(pairs['key'], pairs['value']))
+
+def new_lookups():
+    return {
+        'customer': {},
+        'distance': {},
+        'driver': {},
+        'driver_vehicle': {},
+        'vehicle': {},
+        'clockin': {},
+        'transporter': {},
+        'depot': {},
+        'depot_rows': {}
+    }
+
+def update_lookups(lookups, name, df):
+    # Fold one parsed source (or a chunk of it) into the lookups
+    if df is None or df.empty:
+        return lookups
+
     # 1. Customer Lookup
-    customer_lookup = {}
-    df_cust = load_csv(input_files["Customer"])
-    if df_cust is not None:
-        for _, row in df_cust.iterrows():
-            if pd.notna(row.get('load_name')) and pd.notna(row.get('customer_name')):
-                customer_lookup[str(row['load_name']).strip()] = str(row['customer_name']).strip()
-    
+    if name == "Customer" and {'load_name', 'customer_name'} <= set(df.columns):
+        sub = df[df['load_name'].notna() & df['customer_name'].notna()]
+        lookups['customer'].update(last_by_key(text_column(sub, 'load_name'), text_column(sub, 'customer_name')))
+
     # 2. Distance Lookup
-    distance_lookup = {}
-    df_dist = load_csv(input_files["Distance"])
-    if df_dist is not None:
-        for _, row in df_dist.iterrows():
-            load_name = str(row.get('Load Name', '')).strip()
-            if load_name:
-                distance_lookup[load_name] = {
-                    'PlannedDistanceToCustomer': str(row.get('PlannedDistanceToCustomer', '')).strip(),
-                    'Budgeted Kms': str(row.get('Planned Load Distance', '')).strip(),
-                    'Actual Km': str(row.get('Total DJ Distance for Load', '')).strip(),
-                    'Km Deviation': str(row.get('Distance Difference (Planned vs DJ)', '')).strip(),
-                    'customer': str(row.get('Customer', '')).strip(),
-                    'Vehicle Reg': str(row.get('Vehicle Reg', '')).strip(),
-                    'Driver Name': str(row.get('Driver Name', '')).strip(),
-                    'Transporter': str(row.get('Hired/Own', '')).strip() 
-                }
+    if name == "Distance":
+        fields = pd.DataFrame({
+            'PlannedDistanceToCustomer': numeric_column(df, 'PlannedDistanceToCustomer'),
+            'Budgeted Kms': numeric_column(df, 'Planned Load Distance'),
+            'Actual Km': numeric_column(df, 'Total DJ Distance for Load'),
+            'Km Deviation': numeric_column(df, 'Distance Difference (Planned vs DJ)'),
+            'customer': text_column(df, 'Customer'),
+            'Vehicle Reg': text_column(df, 'Vehicle Reg'),
+            'Driver Name': text_column(df, 'Driver Name'),
+            'Transporter': text_column(df, 'Hired/Own')
+        })
+        keys = text_column(df, 'Load Name')
+        fields = fields[keys != ""]
+        lookups['distance'].update(last_by_key(keys[keys != ""], fields.to_dict('records')))
 
     # 3. Driver & Vehicle Lookups
-    driver_lookup = {}
-    driver_vehicle_lookup = {}
-    vehicle_reg_lookup = {}
-    transporter_lookup = {}
-    
-    # helper to process driver data
-    def process_driver_source(df, load_col, driver_col, vehicle_col, transporter_col=None):
-        if df is None: return
-        for _, row in df.iterrows():
-            load = str(row.get(load_col, '')).strip()
-            driver = str(row.get(driver_col, '')).strip()
-            vehicle = str(row.get(vehicle_col, '')).strip() if vehicle_col else ""
-            transporter = str(row.get(transporter_col, '')).strip() if transporter_col else ""
-
-            if load and driver:
-                driver_lookup[load] = driver
-            
-            if driver and vehicle:
-                d_key = driver.upper()
-                if d_key not in driver_vehicle_lookup: driver_vehicle_lookup[d_key] = {}
-                driver_vehicle_lookup[d_key][vehicle] = driver_vehicle_lookup[d_key].get(vehicle, 0) + 1
-            
-            if load and vehicle:
-                vehicle_reg_lookup[load] = vehicle
-            
-            if load and transporter:
-                transporter_lookup[load] = transporter
-
-    # Process all files for driver/vehicle info
-    process_driver_source(load_csv(input_files["Depot"]), "Load Name", "Driver Name", "Vehicle Reg", "Hired/Own")
-    process_driver_source(load_csv(input_files["Customer"]), "load_name", "DriverName", None)
-    process_driver_source(load_csv(input_files["Distance"]), "Load Name", "Driver Name", "Vehicle Reg", "Hired/Own")
-    process_driver_source(load_csv(input_files["TimeRoute"]), "Load", "Driver", None)
-
-    # 4. Clockin Lookup
-    clockin_lookup = {}
-    df_time = load_csv(input_files["Timestamps"])
-    if df_time is not None:
-        for _, row in df_time.iterrows():
-            load = str(row.get('load_name', '')).strip()
-            if load:
-                clockin_lookup[load] = {
-                    'Clockin Time': str(row.get('Load StartTime (Pre-Trip Start)', '')).strip(),
-                    'Arrival At Depot': str(row.get('ArriveAtDepot(Odo)', '')).strip(),
-                    'schedule_date': str(row.get('schedule_date', '')).strip()
-                }
+    if name in DRIVER_SOURCES:
+        load_col, driver_col, vehicle_col, transporter_col = DRIVER_SOURCES[name]
+        load = text_column(df, load_col)
+        driver = text_column(df, driver_col)
+        vehicle = text_column(df, vehicle_col)
+        transporter = text_column(df, transporter_col)
 
-    return {
-        'customer': customer_lookup,
-        'distance': distance_lookup,
-        'driver': driver_lookup,
-        'driver_vehicle': driver_vehicle_lookup,
-        'vehicle': vehicle_reg_lookup,
-        'clockin': clockin_lookup,
-        'transporter': transporter_lookup
-    }
+        has_load = load != ""
+        has_driver = driver != ""
+        has_vehicle = vehicle != ""
+
+        mask = has_load & has_driver
+        lookups['driver'].update(last_by_key(load[mask], driver[mask]))
+
+        # Vehicle usage counts per driver, in first-seen order so ties resolve as before
+        mask = has_driver & has_vehicle
+        counts = pd.DataFrame({'driver': driver[mask].str.upper(), 'vehicle': vehicle[mask]}) \
+            .groupby(['driver', 'vehicle'], sort=False).size()
+        driver_vehicle_lookup = lookups['driver_vehicle']
+        for (d_key, veh), n in counts.items():
+            v_counts = driver_vehicle_lookup.setdefault(d_key, {})
+            v_counts[veh] = v_counts.get(veh, 0) + int(n)
+
+        mask = has_load & has_vehicle
+        lookups['vehicle'].update(last_by_key(load[mask], vehicle[mask]))
+
+        mask = has_load & (transporter != "")
+        lookups['transporter'].update(last_by_key(load[mask], transporter[mask]))
+
+    # 4. Depot Lookup (lower-cased names, as in Mwarehouse) and rows per depot
+    if name in DEPOT_SOURCES and 'Depot' in df.columns:
+        load = text_column(df, SOURCE_MAPPINGS[name]["columns"]["Load Number"])
+        depot = blank_text(df['Depot']).str.lower()
+        mask = (load != "") & (depot != "")
+        lookups['depot'].update(last_by_key(load[mask], depot[mask]))
+        for d_key, n in depot[depot != ""].value_counts(sort=False).items():
+            lookups['depot_rows'][d_key] = lookups['depot_rows'].get(d_key, 0) + int(n)
+
+    # 5. Clockin Lookup
+    if name == "Timestamps":
+        fields = pd.DataFrame({
+            'Clockin Time': text_column(df, 'Load StartTime (Pre-Trip Start)'),
+            'Arrival At Depot': text_column(df, 'ArriveAtDepot(Odo)'),
+            'schedule_date': text_column(df, 'schedule_date')
+        })
+        keys = text_column(df, 'load_name')
+        fields = fields[keys != ""]
+        lookups['clockin'].update(last_by_key(keys[keys != ""], fields.to_dict('records')))
+
+    return lookups
+
+def build_lookups(frames):
+    print("🔄 Building data lookups for cross-referencing...")
+    lookups = new_lookups()
+    for name in ["Depot", "Customer", "Distance", "TimeRoute", "Timestamps"]:
+        update_lookups(lookups, name, frames.get(name))
+    return lookups
+
+def count_lookup_entries(lookups):
+    return sum(len(lookup) for lookup in lookups.values())
 
 # --- Smart Fill Functions ---
 
-def get_smart_value(load_number, primary_lookup, secondary_lookup=None, key=None):
-    load_str = str(load_number).strip()
-    if not load_str: return ""
-    
-    # Direct match
-    if key:
-        if load_str in primary_lookup:
-            return primary_lookup[load_str].get(key, "")
-    else:
-        if load_str in primary_lookup:
-            return primary_lookup[load_str]
-    
-    return ""
+DISTANCE_FIELDS = ['PlannedDistanceToCustomer', 'Budgeted Kms', 'Actual Km', 'Km Deviation']
 
-def fill_distance_data(row, lookups):
-    load_num = str(row.get('Load Number', '')).strip()
-    cust_name = str(row.get('Customer Name', '')).strip()
-    
-    # Try direct lookup
-    data = lookups['distance'].get(load_num)
-    
-    # Fallback to customer median
-    if not data and cust_name:
-        # Find all data for this customer
-        cust_vals = [d for d in lookups['distance'].values() 
-                     if str(d.get('customer', '')).lower() == cust_name.lower()]
-        
-        if cust_vals:
-            # Create a synthetic data object with medians
-            data = {}
-            for field in ['PlannedDistanceToCustomer', 'Budgeted Kms', 'Actual Km', 'Km Deviation']:
-                try:
-                    vals = [float(d[field]) for d in cust_vals if d.get(field)]
-                    if vals:
-                        data[field] = round(statistics.median(vals), 1)
-                    else:
-                        data[field] = ""
-                except:
-                     data[field] = ""
-    
-    if data:
-        for field in ['PlannedDistanceToCustomer', 'Budgeted Kms', 'Actual Km', 'Km Deviation']:
-            if pd.isna(row.get(field)) or str(row.get(field)).strip() == "":
-                row[field] = data.get(field, "")
-    return row
-
-def fill_vehicle_reg(row, lookups):
-    if pd.notna(row.get('Vehicle Reg')) and str(row.get('Vehicle Reg')).strip() != "":
-        return row
-    
-    load_num = str(row.get('Load Number', '')).strip()
-    driver_name = str(row.get('Driver Name', '')).strip().upper()
-    
-    # 1. Look up by Load
-    if load_num in lookups['vehicle']:
-        row['Vehicle Reg'] = lookups['vehicle'][load_num]
-        return row
-        
-    # 2. Look up by Driver (most common vehicle)
-    if driver_name in lookups['driver_vehicle']:
-        v_counts = lookups['driver_vehicle'][driver_name]
-        try:
-            best_vehicle = max(v_counts.items(), key=lambda x: x[1])[0]
-            row['Vehicle Reg'] = best_vehicle
-            return row
-        except: pass
-        
-    return row
+def blank_mask(series):
+    # Column-wise pd.isna(v) or str(v).strip() == ""
+    return series.isna() | (text_values(series) == "")
+
+def build_distance_medians(distance_lookup):
+    # Per-customer medians of the distance fields, computed once per run.
+    # Indexed by lower-cased customer name.
+    if not distance_lookup:
+        return pd.DataFrame(columns=DISTANCE_FIELDS)
+    dist = pd.DataFrame(list(distance_lookup.values()))
+    key = dist['customer'].str.lower()
+
+    medians = {}
+    for field in DISTANCE_FIELDS:
+        median = pd.to_numeric(dist[field], errors='coerce').groupby(key).median()
+        medians[field] = round_exact(median, 1)
+    return pd.DataFrame(medians)
+
+def fill_distance_data(df, lookups, medians=None, metrics=None):
+    if medians is None:
+        medians = build_distance_medians(lookups['distance'])
+    load_num = text_values(df['Load Number'])
+    cust_name = blank_text(df['Customer Name'])
+
+    # Direct lookup first, customer median as the fallback
+    direct = load_num.isin(lookups['distance'].keys())
+    cust_key = cust_name.str.lower()
+    fallback = ~direct & (cust_name != "") & cust_key.isin(medians.index)
+
+    if direct.any():
+        direct_data = pd.DataFrame.from_dict(lookups['distance'], orient='index')
+    for field in DISTANCE_FIELDS:
+        missing = blank_mask(df[field])
+        if direct.any():
+            mask = missing & direct
+            df[field] = df[field].mask(mask, load_num[mask].map(direct_data[field]))
+        mask = missing & fallback
+        if mask.any():
+            df[field] = df[field].mask(mask, cust_key[mask].map(medians[field]))
+        run_metrics.record_fill(metrics, f"distance:{field}", missing.sum(), (missing & df[field].notna()).sum())
+    return df
+
+def fill_vehicle_reg(df, lookups, metrics=None):
+    missing = blank_mask(df['Vehicle Reg'])
+    if not missing.any():
+        run_metrics.record_fill(metrics, "vehicle_reg", 0, 0)
+        return df
+
+    load_num = text_values(df['Load Number'])
+    driver_name = blank_text(df['Driver Name']).str.upper()
+
+    # 1. Look up by Load, 2. then by Driver (most common vehicle, first seen wins ties)
+    best_vehicle = {d: max(v_counts.items(), key=lambda x: x[1])[0]
+                    for d, v_counts in lookups['driver_vehicle'].items() if v_counts}
+    by_load = load_num.map(lookups['vehicle'])
+    by_driver = driver_name.map(best_vehicle)
+    filled = by_load.fillna(by_driver)
 
-def fill_clockin_data(row, lookups):
+    mask = missing & filled.notna()
+    df['Vehicle Reg'] = set_values(df['Vehicle Reg'], mask, filled)
+    run_metrics.record_fill(metrics, "vehicle_reg", missing.sum(), mask.sum())
+    return df
+
+def fill_clockin_data(df, lookups, metrics=None):
     # Only fill if missing
-    needs_clockin = pd.isna(row.get('Clockin Time')) or str(row.get('Clockin Time')).strip() == ""
-    needs_arr = pd.isna(row.get('Arrival At Depot')) or str(row.get('Arrival At Depot')).strip() == ""
-    
-    if not (needs_clockin or needs_arr):
-        return row
+    load_num = text_values(df['Load Number'])
+    found = load_num.isin(lookups['clockin'].keys())
+    clockin = pd.DataFrame.from_dict(lookups['clockin'], orient='index') if found.any() else None
 
-    load_num = str(row.get('Load Number', '')).strip()
-    data = lookups['clockin'].get(load_num)
-    
-    if data:
-        if needs_clockin: row['Clockin Time'] = data.get('Clockin Time', "")
-        if needs_arr: row['Arrival At Depot'] = data.get('Arrival At Depot', "")
-    
-    return row
+    for field in ['Clockin Time', 'Arrival At Depot']:
+        blank = blank_mask(df[field])
+        mask = found & blank
+        if mask.any():
+            values = parse_datetimes(load_num[mask].map(clockin[field]), cache_key=('Timestamps', field))
+            df[field] = df[field].mask(mask, values)
+        run_metrics.record_fill(metrics, f"clockin:{field}", blank.sum(), (mask & df[field].notna()).sum())
+    return df
+
+def fill_transporter(df, lookups, metrics=None):
+    blank = df['Transporter'].isna()
+    if blank.any():
+        df['Transporter'] = set_values(df['Transporter'], blank, df['Load Number'].map(lookups['transporter']))
+    run_metrics.record_fill(metrics, "transporter", blank.sum(), (blank & df['Transporter'].notna()).sum())
+    return df
+
+def apply_smart_fills(df, lookups, metrics=None):
+    df = fill_distance_data(df, lookups, metrics=metrics)
+    df = fill_vehicle_reg(df, lookups, metrics)
+    df = fill_clockin_data(df, lookups, metrics)
+    df = fill_transporter(df, lookups, metrics)
+    return df
 
 # --- Processing Functions ---
 
-def process_file(filename, map_func, lookups):
-    df = load_csv(filename)
+# Declarative per-source mapping:
+#   columns   - output column <- source column
+#   constants - fixed output values
+#   lookups   - (output column, lookup name, only_if_blank) filled from the load number
+SOURCE_MAPPINGS = {
+    "Depot": {
+        "columns": {
+            "Create Date": "Schedule Date",
+            "Load Number": "Load Name",
+            "Driver Name": "Driver Name",
+            "Vehicle Reg": "Vehicle Reg",
+            "Planned Departure Time": "Planned Departure Time",
+            "Dj Departure Time": "DJ Departure Time",
+            "Departure Deviation Min": "Departure Time Difference (DJ vs Planned)",
+            "Transporter": "Hired/Own",
+        },
+        "constants": {"Mode Of Capture": "DJ"},
+        "lookups": [("Customer Name", "customer", False), ("Driver Name", "driver", True)],
+    },
+    "Customer": {
+        "columns": {
+            "Create Date": "schedule_date",
+            "Load Number": "load_name",
+            "Driver Name": "DriverName",
+            "Customer Name": "customer_name",
+            "Invoice Number": "sales_order_number",
+            "Arrival At Customer": "ArrivedAtCustomer(Odo)",
+            "Departure Time From Customer": "Offloading",
+            "Service Time At Customer": "Total Time Spent @ Customer",
+        },
+        "constants": {"Mode Of Capture": "DJ"},
+        "lookups": [("Driver Name", "driver", True)],
+    },
+    "Distance": {
+        "columns": {
+            "Create Date": "Schedule Date",
+            "Load Number": "Load Name",
+            "Driver Name": "Driver Name",
+            "Vehicle Reg": "Vehicle Reg",
+            "Customer Name": "Customer",
+            "Invoice Number": "Sales Order",
+            "PlannedDistanceToCustomer": "PlannedDistanceToCustomer",
+            "Actual Km": "Total DJ Distance for Load",
+            "Km Deviation": "Distance Difference (Planned vs DJ)",
+            "Transporter": "Hired/Own",
+        },
+        "constants": {"Mode Of Capture": "DJ"},
+        "lookups": [("Customer Name", "customer", True), ("Driver Name", "driver", True)],
+    },
+    "Timestamps": {
+        "columns": {
+            "Create Date": "schedule_date",
+            "Load Number": "load_name",
+            "Clockin Time": "Load StartTime (Pre-Trip Start)",
+            "Arrival At Depot": "ArriveAtDepot(Odo)",
+        },
+        "constants": {"Mode Of Capture": "DJ"},
+        "lookups": [("Customer Name", "customer", False), ("Driver Name", "driver", False)],
+    },
+    "TimeRoute": {
+        "columns": {
+            "Create Date": "Schedule Date",
+            "Load Number": "Load",
+            "Driver Name": "Driver",
+            "Customer Name": "Customer",
+            "Invoice Number": "Sales Order",
+            "Total Hour Route": "Time in Route (min)",
+            "Days In Route Deviation": "Time In Route Difference ( DJ - Planned)",
+        },
+        "constants": {"Mode Of Capture": "DJ"},
+        "lookups": [("Customer Name", "customer", True), ("Driver Name", "driver", True)],
+    },
+}
+
+def month_names(dates):
+    return dates.dt.month_name().fillna("")
+
+def lookup_values(load_keys, lookup):
+    # Column-wise get_smart_value: direct match on the stripped load number
+    values = load_keys.map(lookup).fillna("")
+    return values.where(load_keys != "", "")
+
+def main_depot(lookups):
+    # The depot with the most rows across the sources (None without depot columns)
+    if not lookups['depot_rows']:
+        return None
+    return max(lookups['depot_rows'].items(), key=lambda x: x[1])[0]
+
+def depot_names(df, load_keys, lookups):
+    # Mwarehouse: the row's Depot, else the load's depot in another source, else the
+    # run's main depot (most rows), else the row's Depot Code; lower-cased
+    depot = blank_text(df['Depot']).str.lower() if 'Depot' in df.columns else pd.Series("", index=df.index, dtype=object)
+    depot = depot.mask(depot == "", lookup_values(load_keys, lookups['depot']))
+    if lookups['depot_rows']:
+        depot = depot.mask(depot == "", main_depot(lookups))
+    if 'Depot Code' in df.columns:
+        depot = depot.mask(depot == "", blank_text(df['Depot Code']).str.lower())
+    return depot
+
+def map_source(name, df, lookups):
     if df is None: return pd.DataFrame() # Return empty if file missing
-    
-    processed_rows = []
-    print(f"Processing {filename}...")
-    
-    for _, row in df.iterrows():
-        new_row = map_func(row, lookups)
-        # Apply strict column filtering
-        final_row = {k: new_row.get(k, "") for k in COLUMNS}
-        processed_rows.append(final_row)
-        
-    return pd.DataFrame(processed_rows)
-
-def map_depot(row, lookups):
-    r = {}
-    r["Create Date"] = row.get("Schedule Date")
-    r["Month Name"] = extract_month_name(r["Create Date"])
-    r["Load Number"] = row.get("Load Name")
-    r["Driver Name"] = row.get("Driver Name")
-    r["Vehicle Reg"] = row.get("Vehicle Reg")
-    r["Planned Departure Time"] = row.get("Planned Departure Time")
-    r["Dj Departure Time"] = row.get("DJ Departure Time")
-    r["Departure Deviation Min"] = row.get("Departure Time Difference (DJ vs Planned)")
-    r["Transporter"] = row.get("Hired/Own")
-    r["Mwarehouse"] = "jinja"
-    r["Mode Of Capture"] = "DJ"
-    
-    # Logic to fill missing
-    r["Customer Name"] = get_smart_value(r["Load Number"], lookups['customer'])
-    if not r["Driver Name"]: r["Driver Name"] = get_smart_value(r["Load Number"], lookups['driver'])
-    
-    return r
-
-def map_customer(row, lookups):
-    r = {}
-    r["Create Date"] = row.get("schedule_date")
-    r["Month Name"] = extract_month_name(r["Create Date"])
-    r["Load Number"] = row.get("load_name")
-    r["Driver Name"] = row.get("DriverName")
-    r["Customer Name"] = row.get("customer_name")
-    r["Invoice Number"] = row.get("sales_order_number")
-    r["Arrival At Customer"] = row.get("ArrivedAtCustomer(Odo)")
-    r["Departure Time From Customer"] = row.get("Offloading")
-    r["Service Time At Customer"] = row.get("Total Time Spent @ Customer")
-    r["Mwarehouse"] = "jinja"
-    r["Mode Of Capture"] = "DJ"
-    
-    if not r["Driver Name"]: r["Driver Name"] = get_smart_value(r["Load Number"], lookups['driver'])
-    return r
-
-def map_distance(row, lookups):
-    r = {}
-    r["Create Date"] = row.get("Schedule Date")
-    r["Month Name"] = extract_month_name(r["Create Date"])
-    r["Load Number"] = row.get("Load Name")
-    r["Driver Name"] = row.get("Driver Name")
-    r["Vehicle Reg"] = row.get("Vehicle Reg")
-    r["Customer Name"] = row.get("Customer")
-    r["Invoice Number"] = row.get("Sales Order")
-    r["PlannedDistanceToCustomer"] = row.get("PlannedDistanceToCustomer")
-    r["Actual Km"] = row.get("Total DJ Distance for Load")
-    r["Km Deviation"] = row.get("Distance Difference (Planned vs DJ)")
-    r["Transporter"] = row.get("Hired/Own")
-    r["Mwarehouse"] = "jinja"
-    r["Mode Of Capture"] = "DJ"
-    
-    if not r["Customer Name"]: r["Customer Name"] = get_smart_value(r["Load Number"], lookups['customer'])
-    if not r["Driver Name"]: r["Driver Name"] = get_smart_value(r["Load Number"], lookups['driver'])
-    return r
-
-def map_timestamps(row, lookups):
-    r = {}
-    r["Create Date"] = row.get("schedule_date")
-    r["Month Name"] = extract_month_name(r["Create Date"])
-    r["Load Number"] = row.get("load_name")
-    r["Clockin Time"] = row.get("Load StartTime (Pre-Trip Start)")
-    r["Arrival At Depot"] = row.get("ArriveAtDepot(Odo)")
-    r["Mwarehouse"] = "jinja"
-    r["Mode Of Capture"] = "DJ"
-    
-    r["Customer Name"] = get_smart_value(r["Load Number"], lookups['customer'])
-    r["Driver Name"] = get_smart_value(r["Load Number"], lookups['driver'])
-    return r
-
-def map_timeroute(row, lookups):
-    r = {}
-    r["Create Date"] = row.get("Schedule Date")
-    r["Month Name"] = extract_month_name(r["Create Date"])
-    r["Load Number"] = row.get("Load")
-    r["Driver Name"] = row.get("Driver")
-    r["Customer Name"] = row.get("Customer")
-    r["Invoice Number"] = row.get("Sales Order")
-    r["Total Hour Route"] = row.get("Time in Route (min)")
-    r["Days In Route Deviation"] = row.get("Time In Route Difference ( DJ - Planned)")
-    r["Mwarehouse"] = "jinja"
-    r["Mode Of Capture"] = "DJ"
-    
-    if not r["Customer Name"]: r["Customer Name"] = get_smart_value(r["Load Number"], lookups['customer'])
-    if not r["Driver Name"]: r["Driver Name"] = get_smart_value(r["Load Number"], lookups['driver'])
-    return r
 
-# --- Calculation Logic (Legacy support) ---
+    spec = SOURCE_MAPPINGS[name]
+    out = {}
+    missing = set()
+    for target, source_col in spec["columns"].items():
+        if source_col in df.columns:
+            out[target] = df[source_col]
+        else:
+            out[target] = pd.Series(None, index=df.index, dtype=object)
+            missing.add(target)
+
+    # Timestamp columns are datetime64 in every source (NaT where a source lacks them)
+    for target in DATETIME_COLUMNS:
+        values = out.get(target, pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]'))
+        out[target] = parse_datetimes(values, cache_key=(name, target))
+    out["Month Name"] = month_names(out["Create Date"])
+    out.update(spec["constants"])
+
+    load_keys = text_values(out["Load Number"])
+    out["Mwarehouse"] = depot_names(df, load_keys, lookups)
+    for target, lookup_name, only_if_blank in spec["lookups"]:
+        filled = lookup_values(load_keys, lookups[lookup_name])
+        if only_if_blank and target in out and target not in missing:
+            # Mirrors `if not value`: only empty strings count as blank, NaN does not
+            blank = out[target].eq("")
+            if blank.any():
+                out[target] = out[target].mask(blank, filled)
+        else:
+            out[target] = filled
+
+    mapped = pd.DataFrame({col: out.get(col, "") for col in COLUMNS}, index=df.index).reset_index(drop=True)
+    return apply_schema(mapped)
+
+# --- Consolidation ---
+
+# Default precedence when the same load appears in several sources: earlier wins
+SOURCE_ORDER = ["Depot", "Customer", "Distance", "Timestamps", "TimeRoute"]
+
+def resolve_source_order(source_order=None):
+    if source_order is None:
+        return list(SOURCE_ORDER)
+    unknown = [name for name in source_order if name not in SOURCE_ORDER]
+    if unknown:
+        raise ValueError(f"Unknown source(s) in source_order: {', '.join(unknown)}")
+    # Sources not named keep their default relative order after the named ones
+    order = list(dict.fromkeys(source_order))
+    return order + [name for name in SOURCE_ORDER if name not in order]
+
+def first_by_load(df):
+    # One row per Load Number (index) with the first non-empty value of each
+    # column in row order; missing values stay NA
+    df['Load Number'] = df['Load Number'].astype(str).str.strip()
+    df = df[(df['Load Number'] != "") & (df['Load Number'] != "nan")]
+
+    # Empty strings count as missing, so the native first() can skip them
+    # (typed columns already hold NA for blanks)
+    text = [col for col in df.columns if SCHEMA.get(col) == "text"]
+    df[text] = df[text].mask(df[text].eq(""))
+    return df.groupby('Load Number', sort=True).first()
+
+def fold_loads(store, df):
+    # Incremental consolidation: values already in the store came from earlier
+    # rows, so they win; the chunk only fills what is still missing
+    chunk = first_by_load(df)
+    # Object columns, so aligning with the store doesn't turn ints into floats
+    chunk = chunk.astype({col: object for col in chunk.columns
+                          if not pd.api.types.is_datetime64_any_dtype(chunk[col])})
+    if store is None:
+        return chunk
+    return store.combine_first(chunk)[chunk.columns]
+
+def typed_frame(df):
+    # Schema dtypes for a whole frame; text columns use "" for blanks
+    df = apply_schema(df)
+    for col in df.columns:
+        if SCHEMA.get(col) == "text":
+            df[col] = df[col].astype(object).fillna("")
+    return df
+
+def finish_consolidation(consolidated):
+    return typed_frame(consolidated.reset_index())
+
+def consolidate_loads(df):
+    return finish_consolidation(first_by_load(df))
+
+# --- Calculation Logic ---
+
+# A departure/arrival within 30 minutes either side of its depot's monthly average
+# time of day (measured the short way round midnight) is "On Time"; earlier is
+# "Early" and later is "Late"
+AVE_TIME_TOLERANCE_MIN = 30
+MINUTES_PER_DAY = 24 * 60
+
+def missing_mask(series):
+    return series.isna() | series.eq("")
+
+def round_exact(values, digits):
+    # Python's round() per value: np.round can differ in the last digit
+    out = values.astype(float).copy()
+    valid = out.notna()
+    out[valid] = [round(v, digits) for v in out[valid].tolist()]
+    return out
+
+def route_span(df, start_col, end_col, unit_seconds):
+    # Elapsed time between two datetime columns, NaN where either is missing
+    span = (df[end_col] - df[start_col]).dt.total_seconds() / unit_seconds
+    return round_exact(span, 2)
+
+def fill_missing(df, col, values):
+    # Only fill when missing; keeps whatever the sources supplied
+    mask = missing_mask(df[col])
+    if mask.any():
+        df[col] = set_values(df[col], mask, values)
+    return df
+
+def average_time_of_day(minutes, keys):
+    # Circular mean of times of day per group, so 23:50 and 00:10 average to 00:00;
+    # NaN where the times cancel out (no meaningful average)
+    angle = minutes * (2 * np.pi / MINUTES_PER_DAY)
+    sin = np.sin(angle).groupby(keys, dropna=False, observed=True).transform('mean')
+    cos = np.cos(angle).groupby(keys, dropna=False, observed=True).transform('mean')
+    average = (np.arctan2(sin, cos) * (MINUTES_PER_DAY / (2 * np.pi))).round() % MINUTES_PER_DAY
+    return average.where(np.hypot(sin, cos) > 1e-9)
+
+def compare_to_average(df, time_col, ave_col, comment_col):
+    # Time of day vs the depot's monthly average time of day
+    minutes = (df[time_col].dt.hour * 60 + df[time_col].dt.minute).astype(float)
+    average = average_time_of_day(minutes, [df['Mwarehouse'], df['Month Name']])
+
+    ave_text = pd.to_datetime(average, unit='m').dt.strftime('%H:%M')
+    # Signed difference the short way round midnight, in [-720, 720)
+    diff = (minutes - average + MINUTES_PER_DAY / 2) % MINUTES_PER_DAY - MINUTES_PER_DAY / 2
+    comment = pd.Series(np.select([diff < -AVE_TIME_TOLERANCE_MIN, diff > AVE_TIME_TOLERANCE_MIN],
+                                  ["Early", "Late"], "On Time"), index=df.index)
+
+    has_time = minutes.notna() & average.notna()
+    df = fill_missing(df, ave_col, ave_text.where(has_time))
+    df = fill_missing(df, comment_col, comment.where(has_time))
+    return df
+
+def calc_route_times(df):
+    # Per-load figures; each row only depends on its own timestamps
+    # Days and hours in route from the datetime columns (see parse_datetimes)
+    df = fill_missing(df, 'Actual Days In Route', route_span(df, 'Dj Departure Time', 'Arrival At Depot', 24 * 3600))
+    df = fill_missing(df, 'Bud Days In Route', route_span(df, 'Planned Departure Time', 'Arrival At Depot', 24 * 3600))
+    df = fill_missing(df, 'Total Hour Route', route_span(df, 'Dj Departure Time', 'Arrival At Depot', 3600))
 
-def perform_final_calcs(df):
-    print("🧮 Performing final route calculations...")
-    
-    def calc_days(row, start_col, end_col):
-        try:
-            dep = pd.to_datetime(row.get(start_col))
-            arr = pd.to_datetime(row.get(end_col))
-            if pd.notna(dep) and pd.notna(arr):
-                val = (arr - dep).total_seconds() / (24 * 3600)
-                return round(val, 2)
-        except: pass
-        return np.nan
-
-    def calc_hours(row, start_col, end_col):
-        try:
-            dep = pd.to_datetime(row.get(start_col))
-            arr = pd.to_datetime(row.get(end_col))
-            if pd.notna(dep) and pd.notna(arr):
-                val = (arr - dep).total_seconds() / 3600
-                return round(val, 2)
-        except: pass
-        return np.nan
-
-    for idx, row in df.iterrows():
-        # Actual Days
-        if pd.isna(row.get('Actual Days In Route')) or row.get('Actual Days In Route') == "":
-            df.at[idx, 'Actual Days In Route'] = calc_days(row, 'Dj Departure Time', 'Arrival At Depot')
-            
-        # Bud Days
-        if pd.isna(row.get('Bud Days In Route')) or row.get('Bud Days In Route') == "":
-            df.at[idx, 'Bud Days In Route'] = calc_days(row, 'Planned Departure Time', 'Arrival At Depot')
-            
-        # Total Hours
-        if pd.isna(row.get('Total Hour Route')) or row.get('Total Hour Route') == "":
-            df.at[idx, 'Total Hour Route'] = calc_hours(row, 'Dj Departure Time', 'Arrival At Depot')
-            
     # Deviations
     df['Actual Days In Route'] = pd.to_numeric(df['Actual Days In Route'], errors='coerce')
     df['Bud Days In Route'] = pd.to_numeric(df['Bud Days In Route'], errors='coerce')
-    
-    mask = df['Days In Route Deviation'].isna() | (df['Days In Route Deviation'] == "")
-    if mask.any():
-        df.loc[mask, 'Days In Route Deviation'] = df.loc[mask, 'Actual Days In Route'] - df.loc[mask, 'Bud Days In Route']
+    df = fill_missing(df, 'Days In Route Deviation', df['Actual Days In Route'] - df['Bud Days In Route'])
 
+    # Driver Rest Hours In Route is left as the sources supplied it: the exports carry
+    # no rest or driving time to derive it from
     return df
 
+def calc_time_averages(df):
+    # Cross-load figures: departure / arrival time of day against the monthly average
+    df = compare_to_average(df, 'Dj Departure Time', 'Ave Departure', 'Comment Ave Departure')
+    df = compare_to_average(df, 'Arrival At Depot', 'Ave Arrival Time', 'Comment Ave Arrival Time')
+    return df
+
+def perform_final_calcs(df):
+    print("🧮 Performing final route calculations...")
+    df = calc_route_times(df)
+    df = calc_time_averages(df)
+    return df
+
+# --- Parallel Mapping ---
+# Mapping only reads the lookups, so sources (and row shards of big sources) can be
+# mapped in separate processes; each worker receives the lookups once, at start-up.
+SHARD_ROWS = 250000
+_worker_lookups = None
+
+def init_mapping_worker(lookups):
+    global _worker_lookups
+    _worker_lookups = lookups
+
+def map_shard(name, df):
+    return map_source(name, df, _worker_lookups)
+
+def shard_frame(df, shard_rows):
+    return [df.iloc[start:start + shard_rows] for start in range(0, len(df), shard_rows)] or [df]
+
+def map_sources(frames, order, lookups, labels, workers=None, shard_rows=SHARD_ROWS):
+    # Mapped frames in precedence order (shards in row order), whatever the number of workers
+    names = [name for name in order if frames.get(name) is not None]
+    for name in names:
+        print(f"Processing {labels[name]}...")
+    if not names or not workers or workers <= 1:
+        return [map_source(name, frames[name], lookups) for name in names]
+
+    tasks = [(name, shard) for name in names for shard in shard_frame(frames[name], shard_rows)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=init_mapping_worker,
+                             initargs=(lookups,)) as pool:
+        return list(pool.map(map_shard, *zip(*tasks)))
+
+# --- Output Writers ---
+OUTPUT_NAME = "Final_Consolidated_Data_Complete"
+# "pickle" is a full-fidelity snapshot of the final frame for folders this process owns (loading a
+# pickle can run code); anything shared is read back from the CSV instead (see read_output)
+OUTPUT_FORMATS = {"xlsx": ".xlsx", "csv": ".csv", "parquet": ".parquet", "pickle": ".pkl"}
+FORMAT_LABELS = {"xlsx": "Excel", "csv": "CSV", "parquet": "Parquet", "pickle": "pickle"}
+DEFAULT_FORMATS = ["xlsx", "csv"]
+
+def output_path(base_dir, fmt):
+    return os.path.join(base_dir, OUTPUT_NAME + OUTPUT_FORMATS[fmt])
+
+def resolve_formats(formats=None):
+    formats = list(dict.fromkeys(formats or DEFAULT_FORMATS))
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {', '.join(unknown)}; expected {', '.join(OUTPUT_FORMATS)}")
+    if "parquet" in formats and not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        raise ValueError("Parquet output needs pyarrow or fastparquet installed")
+    return formats
+
+def whole_numbers(df):
+    # WHOLE_NUMBER_COLUMNS with whole values as ints (798, not 798.0), others as they are
+    out = df.copy(deep=False)
+    for col in WHOLE_NUMBER_COLUMNS:
+        if col in df.columns and pd.api.types.is_float_dtype(df[col]):
+            whole = (df[col] % 1 == 0).fillna(False).to_numpy(dtype=bool)
+            values = df[col].astype(object)
+            values[whole] = [int(v) for v in df[col][whole]]
+            out[col] = values
+    return out
+
+def write_csv(df, path):
+    whole_numbers(df).to_csv(path, index=False, date_format=DATETIME_OUTPUT_FORMAT)
+
+def write_xlsx(df, path):
+    # openpyxl's write-only mode streams rows out instead of building every cell in
+    # memory first; same header style and datetime format as DataFrame.to_excel.
+    # Imported here so runs without Excel output never load openpyxl
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    thin = Side(style='thin')
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal='center', vertical='top')
+        header.append(cell)
+    ws.append(header)
+
+    datetime_positions = [i for i, col in enumerate(df.columns) if pd.api.types.is_datetime64_any_dtype(df[col])]
+    # Blank cells are left out entirely rather than written as empty strings
+    values = whole_numbers(df).astype(object).where(df.notna(), None)
+    values = values.where(values.ne(""), None)
+    for row in values.itertuples(index=False, name=None):
+        row = list(row)
+        for i in datetime_positions:
+            if row[i] is not None:
+                cell = WriteOnlyCell(ws, value=row[i].to_pydatetime())
+                cell.number_format = EXCEL_DATETIME_FORMAT
+                row[i] = cell
+        ws.append(row)
+    wb.save(path)
+
+def write_parquet(df, path):
+    # Parquet columns need a single type: numeric where every value is, text otherwise
+    out = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].mask(df[col].eq(""))
+        numeric = pd.to_numeric(values, errors='coerce')
+        out[col] = numeric if numeric.notna().sum() == values.notna().sum() else values.astype('string')
+    out.to_parquet(path, index=False)
+
+def write_pickle(df, path):
+    df.to_pickle(path)
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet, "pickle": write_pickle}
+
+def write_outputs(df, base_dir, formats):
+    # One writer thread per format
+    with ThreadPoolExecutor(max_workers=len(formats)) as pool:
+        futures = [pool.submit(WRITERS[fmt], df, output_path(base_dir, fmt)) for fmt in formats]
+        for future in futures:
+            future.result()
+    return [output_path(base_dir, fmt) for fmt in formats]
+
+def export_output(base_dir, fmt):
+    # Produce another format later from the CSV of a finished run
+    fmt = resolve_formats([fmt])[0]
+    df = read_output(base_dir)
+    path = output_path(base_dir, fmt)
+    # Written under a temporary name so a half-written file is never served
+    tmp = f"{path}.tmp-{os.getpid()}{OUTPUT_FORMATS[fmt]}"
+    WRITERS[fmt](df, tmp)
+    os.replace(tmp, path)
+    return path
+
+def read_output(base_dir):
+    # The consolidated frame of a finished run, typed back from its CSV
+    return typed_frame(pd.read_csv(output_path(base_dir, "csv"), dtype=str, keep_default_na=False))
+
+def read_snapshot(base_dir):
+    # The pickle snapshot of a run in a private working folder (never a shared one)
+    return pd.read_pickle(output_path(base_dir, "pickle"))
+
 # --- Main Execution ---
 
-def process_data_func(base_dir='.'):
-    print(f"🚀 Starting Data Combiner App in {base_dir}...")
-    
-    input_files = get_file_paths(base_dir)
-    
-    # 1. Build Lookups
-    lookups = build_lookups(input_files)
-    
-    # 2. Process Files
-    dfs = []
-    if os.path.exists(input_files["Depot"]): dfs.append(process_file(input_files["Depot"], map_depot, lookups))
-    if os.path.exists(input_files["Customer"]): dfs.append(process_file(input_files["Customer"], map_customer, lookups))
-    if os.path.exists(input_files["Distance"]): dfs.append(process_file(input_files["Distance"], map_distance, lookups))
-    if os.path.exists(input_files["Timestamps"]): dfs.append(process_file(input_files["Timestamps"], map_timestamps, lookups))
-    if os.path.exists(input_files["TimeRoute"]): dfs.append(process_file(input_files["TimeRoute"], map_timeroute, lookups))
+MONTH_ORDER = {
+    'January': 1, 'February': 2, 'March': 3, 'April': 4,
+    'May': 5, 'June': 6, 'July': 7, 'August': 8,
+    'September': 9, 'October': 10, 'November': 11, 'December': 12
+}
+
+def sort_by_month(df):
+    df['Month_Idx'] = df['Month Name'].astype(object).map(MONTH_ORDER).fillna(99)
+    df = df.sort_values('Month_Idx')
+    return df.drop('Month_Idx', axis=1)
+
+def report(progress, stage):
+    # Tell an optional observer (e.g. the web job queue) which stage is running
+    if progress:
+        progress(stage)
+
+def consolidate_frames(frames, order, lookups, labels, progress=None, workers=None, metrics=None):
+    # Map the parsed sources (in precedence order) and consolidate by Load Number
+    report(progress, "mapping")
+    run_metrics.record(metrics, rows_in=count_rows(frames))
+    dfs = map_sources(frames, order, lookups, labels, workers)
     
     if not dfs:
-        return "❌ No data processed! Please ensure CSV files are present."
+        return None
 
     # 3. Concatenate
     print("🔗 Combining dataframes...")
-    final_df = pd.concat(dfs, ignore_index=True)
+    final_df = concat_typed(dfs)
+    memory_report(final_df, "mapped", metrics)
     
     # 4. Consolidate by Load Number
+    report(progress, "consolidating")
     print("🧹 Consolidating duplicate load numbers...")
+    consolidated = consolidate_loads(final_df)
+    memory_report(consolidated, "consolidated", metrics)
+    return consolidated
+
+def combine_in_memory(input_files, order, progress=None, workers=None, metrics=None, input_cache_dir=None):
+    # 1. Read each source once, then build lookups from the parsed frames
+    report(progress, "reading")
+    frames = load_sources(input_files, input_cache_dir)
+    run_metrics.record(metrics, rows_out=count_rows(frames))
+    report(progress, "lookups")
+    lookups = build_lookups(frames)
+    run_metrics.record(metrics, rows_out=count_lookup_entries(lookups))
     
-    def first_valid(series):
-        v = series.dropna()
-        v = v[v != ""]
-        return v.iloc[0] if not v.empty else ""
-
-    final_df['Load Number'] = final_df['Load Number'].astype(str).str.strip()
-    final_df = final_df[final_df['Load Number'] != ""]
-    final_df = final_df[final_df['Load Number'] != "nan"]
-    
-    final_df = final_df.groupby('Load Number', as_index=False).agg(first_valid)
+    # 2. Map, combine and consolidate
+    labels = {name: source_label(name, source) for name, source in input_files.items()}
+    return consolidate_frames(frames, order, lookups, labels, progress, workers, metrics), lookups
+
+def source_digests(frames, order):
+    # Digest of each load's rows per source (row contents and their order)
+    parts = []
+    for name in order:
+        df = frames.get(name)
+        if df is None or df.empty:
+            continue
+        loads = text_column(df, SOURCE_MAPPINGS[name]["columns"]["Load Number"])
+        row_hash = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        position = loads.groupby(loads, sort=False).cumcount().to_numpy()
+        mixed = pd.util.hash_pandas_object(pd.DataFrame({'row': row_hash, 'position': position}), index=False)
+        digest = pd.Series(mixed.to_numpy(), index=loads.to_numpy()).groupby(level=0).sum()
+        parts.append(pd.DataFrame({
+            'load_number': digest.index,
+            'source': name,
+            'digest': [format(int(v), '016x') for v in digest.to_numpy()]
+        }))
+    if not parts:
+        return pd.DataFrame(columns=['load_number', 'source', 'digest'])
+    digests = pd.concat(parts, ignore_index=True)
+    return digests[~digests['load_number'].isin(["", "nan"])]
+
+def combine_incremental(input_files, order, store_path, progress=None, workers=None, metrics=None,
+                        input_cache_dir=None):
+    # Only loads whose source rows changed since the last run are re-mapped and
+    # re-consolidated; the rest come from the store. Smart fills and calculations
+    # draw on other loads (customer medians, drivers' usual vehicles, monthly
+    # averages), so they run over every stored load, as in a full run. The KPI
+    # rollup is kept in the store too and only the groups of loads whose labels or
+    # measures changed (before and after the change) are recomputed.
+    report(progress, "reading")
+    frames = load_sources(input_files, input_cache_dir)
+    run_metrics.record(metrics, rows_out=count_rows(frames))
+    report(progress, "lookups")
+    lookups = build_lookups(frames)
+    run_metrics.record(metrics, rows_out=count_lookup_entries(lookups))
+    # Same outcome as a full run: nothing readable fails, header-only files give empty outputs
+    if all(df is None for df in frames.values()):
+        return None, None
+
+    # Mapping falls back to the run's main depot, so a new one invalidates every stored record
+    signature = {"columns": COLUMNS, "order": order, "main_depot": main_depot(lookups)}
+    conn = load_store.open_store(store_path, COLUMNS, signature)
+    try:
+        digests = source_digests(frames, order)
+        changed, removed = load_store.diff_digests(load_store.read_digests(conn), digests)
+        print(f"♻️ Incremental run: {len(changed)} new/changed loads, {len(removed)} removed")
+
+        records = pd.DataFrame(columns=["Load Number"] + [c for c in COLUMNS if c != "Load Number"])
+        if changed:
+            subset = {}
+            for name, df in frames.items():
+                if df is not None:
+                    loads = text_column(df, SOURCE_MAPPINGS[name]["columns"]["Load Number"])
+                    subset[name] = df[loads.isin(changed)]
+            labels = {name: source_label(name, source) for name, source in input_files.items()}
+            records = consolidate_frames(subset, order, lookups, labels, progress, workers, metrics)
+
+        # The store keeps the consolidated records as mapped, before any fills
+        load_store.save_loads(conn, records, digests[digests['load_number'].isin(changed)], removed)
+        final_df = typed_frame(load_store.read_loads(conn, list(records.columns), DATETIME_COLUMNS))
+        memory_report(final_df, "loaded from store")
+
+        report(progress, "smart_fill")
+        run_metrics.record(metrics, rows_in=len(final_df))
+        print("🧠 Applying smart fill logic to consolidated data...")
+        final_df = apply_smart_fills(final_df, lookups, metrics)
+        memory_report(final_df, "smart fill", metrics)
+
+        report(progress, "calculations")
+        final_df = perform_final_calcs(final_df)
+        memory_report(final_df, "calculations", metrics)
+
+        report(progress, "kpis")
+        inputs = kpis.kpi_inputs(final_df)
+        stored = load_store.read_table(conn, "kpis", kpis.KPI_COLUMNS)
+        previous = load_store.read_table(conn, "kpi_inputs", list(inputs.columns))
+        if stored is None or previous is None:
+            print("📈 Computing KPI rollups...")
+            kpi_table = kpis.compute_kpis(final_df)
+        else:
+            groups = kpis.changed_groups(previous, inputs)
+            print(f"📈 Updating KPI rollups for {sum(len(v) for v in groups.values())} affected groups...")
+            kpi_table = kpis.update_kpis(stored.astype({"count": int}), final_df, groups)
+        load_store.save_table(conn, "kpis", kpi_table)
+        load_store.save_table(conn, "kpi_inputs", inputs)
+        run_metrics.record(metrics, rows_out=len(kpi_table))
+    finally:
+        conn.close()
+    return final_df, kpi_table
+
+def combine_streaming(input_files, order, chunksize, progress=None, metrics=None):
+    # Two passes over each file in chunks: first the lookups, then mapping folded
+    # into a store keyed by Load Number. Peak memory follows the number of
+    # distinct loads rather than total input rows.
+    print(f"📥 Streaming input files in chunks of {chunksize} rows...")
+    report(progress, "lookups")
+    print("🔄 Building data lookups for cross-referencing...")
+    lookups = new_lookups()
+    float_columns = {name: set() for name in input_files}
+    rows = 0
+    for name in ["Depot", "Customer", "Distance", "TimeRoute", "Timestamps"]:
+        for chunk in iter_chunks(input_files[name], chunksize):
+            update_lookups(lookups, name, chunk)
+            float_columns[name].update(chunk.select_dtypes('float').columns)
+            rows += len(chunk)
+    run_metrics.record(metrics, rows_in=rows, rows_out=count_lookup_entries(lookups))
+
+    report(progress, "mapping")
+    run_metrics.record(metrics, rows_in=rows)
+    print("🧹 Consolidating duplicate load numbers...")
+    store = None
+    for name in order:
+        if not source_exists(input_files[name]):
+            continue
+        print(f"Processing {source_label(name, input_files[name])}...")
+        for chunk in iter_chunks(input_files[name], chunksize):
+            # A whole-file read makes an int column with gaps float; match that per chunk
+            chunk = chunk.astype({col: float for col in float_columns[name]
+                                  if pd.api.types.is_integer_dtype(chunk[col])})
+            store = fold_loads(store, map_source(name, chunk, lookups))
+
+    if store is None:
+        return None, lookups
+    consolidated = finish_consolidation(store)
+    memory_report(consolidated, "consolidated", metrics)
+    return consolidated, lookups
+
+def process_data_func(base_dir='.', source_order=None, chunksize=None, max_memory=None, store_path=None,
+                      progress=None, inputs=None, formats=None, workers=None, metrics=None, input_cache_dir=None):
+    # inputs maps source names (see SOURCE_FILES) to a path, bytes or file object and
+    # takes precedence over the files in base_dir, which also receives the outputs;
+    # chunksize (rows) or max_memory (MB) switches to the bounded-memory streaming mode;
+    # store_path keeps a persistent store so reruns only recompute changed loads;
+    # workers > 1 maps the sources in a process pool (not with chunked streaming);
+    # formats picks the outputs (see OUTPUT_FORMATS), written concurrently;
+    # progress(stage) is called as each stage starts; metrics (a run_metrics.RunMetrics)
+    # collects per-stage timings, row counts, memory and fill hit rates; input_cache_dir
+    # keeps parsed input files so reruns over unchanged files skip CSV parsing
+    if metrics:
+        progress = metrics.observe(progress)
+    print(f"🚀 Starting Data Combiner App in {base_dir}...")
     
-    # 5. Post-Consolidation Filling
-    print("🧠 Applying smart fill logic to consolidated data...")
-    final_df = final_df.apply(lambda row: fill_distance_data(row, lookups), axis=1)
-    final_df = final_df.apply(lambda row: fill_vehicle_reg(row, lookups), axis=1)
-    final_df = final_df.apply(lambda row: fill_clockin_data(row, lookups), axis=1)
+    input_files = get_file_paths(base_dir)
+    for name, source in (inputs or {}).items():
+        if name not in input_files:
+            raise ValueError(f"Unknown source {name!r}; expected one of {', '.join(SOURCE_FILES)}")
+        input_files[name] = as_source(source)
+    order = resolve_source_order(source_order)
+    formats = resolve_formats(formats)
     
-    for idx, row in final_df.iterrows():
-        if not row['Transporter']:
-            final_df.at[idx, 'Transporter'] = lookups['transporter'].get(row['Load Number'], "")
-            
-    # 6. Final Calculations
-    final_df = perform_final_calcs(final_df)
+    if store_path and (chunksize or max_memory):
+        raise ValueError("store_path cannot be combined with chunked streaming")
+    if workers and workers > 1 and (chunksize or max_memory):
+        raise ValueError("workers cannot be combined with chunked streaming")
     
-    # 7. Sorting
-    month_order = {
-        'January': 1, 'February': 2, 'March': 3, 'April': 4,
-        'May': 5, 'June': 6, 'July': 7, 'August': 8,
-        'September': 9, 'October': 10, 'November': 11, 'December': 12
-    }
-    final_df['Month_Idx'] = final_df['Month Name'].map(month_order).fillna(99)
-    final_df = final_df.sort_values('Month_Idx')
-    final_df = final_df.drop('Month_Idx', axis=1)
+    if store_path:
+        # Steps 1-7 for changed loads only (see combine_incremental)
+        final_df, kpi_table = combine_incremental(input_files, order, store_path, progress, workers, metrics,
+                                                     input_cache_dir)
+        if final_df is None:
+            return "❌ No data processed! Please ensure CSV files are present."
+    else:
+        if max_memory and not chunksize:
+            chunksize = estimate_chunksize(input_files, max_memory)
+        if chunksize:
+            final_df, lookups = combine_streaming(input_files, order, chunksize, progress, metrics)
+        else:
+            final_df, lookups = combine_in_memory(input_files, order, progress, workers, metrics, input_cache_dir)
+        
+        if final_df is None:
+            return "❌ No data processed! Please ensure CSV files are present."
+        
+        # 5. Post-Consolidation Filling
+        report(progress, "smart_fill")
+        print("🧠 Applying smart fill logic to consolidated data...")
+        final_df = apply_smart_fills(final_df, lookups, metrics)
+        memory_report(final_df, "smart fill", metrics)
+                
+        # 6. Final Calculations
+        report(progress, "calculations")
+        final_df = perform_final_calcs(final_df)
+        memory_report(final_df, "calculations", metrics)
+
+        # 7. KPI rollups
+        report(progress, "kpis")
+        print("📈 Computing KPI rollups...")
+        kpi_table = kpis.compute_kpis(final_df)
+        run_metrics.record(metrics, rows_out=len(kpi_table))
     
-    # 8. Save
-    print(f"💾 Saving {len(final_df)} records to Excel/CSV...")
-    output_excel = os.path.join(base_dir, "Final_Consolidated_Data_Complete.xlsx")
-    output_csv = os.path.join(base_dir, "Final_Consolidated_Data_Complete.csv")
+    # 8. Sorting
+    final_df = sort_by_month(final_df)
     
-    final_df.to_excel(output_excel, index=False)
-    final_df.to_csv(output_csv, index=False)
+    # 9. Save
+    report(progress, "saving")
+    # The stage before is the KPI rollup; what gets saved is the loads
+    run_metrics.record(metrics, rows_in=len(final_df))
+    print(f"💾 Saving {len(final_df)} records to {'/'.join(FORMAT_LABELS[fmt] for fmt in formats)}...")
+    write_outputs(final_df, base_dir, formats)
+    kpis.write_kpis(kpi_table, os.path.join(base_dir, kpis.KPI_NAME))
+    run_metrics.record(metrics, rows_out=len(final_df))
     return "✅ Done! Files saved successfully."
 
 if __name__ == "__main__":
-    process_data_func()
+    parser = argparse.ArgumentParser(description="Combine the five logistics exports into one consolidated file.")
+    parser.add_argument("base_dir", nargs="?", default=".", help="folder holding the five CSV files (plain, .csv.gz or .csv.zip)")
+    parser.add_argument("--chunksize", type=int, help="stream each file in chunks of this many rows")
+    parser.add_argument("--max-memory", type=int, metavar="MB", help="stream with chunks sized to this memory budget")
+    parser.add_argument("--store", metavar="PATH", help="SQLite store for incremental reruns (only changed loads are recomputed)")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"comma-separated output formats out of {', '.join(OUTPUT_FORMATS)} (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="map the sources in this many parallel processes")
+    parser.add_argument("--metrics", metavar="PATH", help="write per-stage run metrics as JSON to this file")
+    parser.add_argument("--input-cache", metavar="DIR",
+                        help="parsed-input cache, so unchanged files aren't parsed again; only use a folder no one "
+                             f"else can write to (default: {input_cache.default_cache_dir()})")
+    parser.add_argument("--no-input-cache", action="store_true", help="always parse the input files")
+    args = parser.parse_args()
+    metrics = run_metrics.RunMetrics() if args.metrics else None
+    input_cache_dir = None if args.no_input_cache else args.input_cache or input_cache.default_cache_dir()
+    status = process_data_func(args.base_dir, chunksize=args.chunksize, max_memory=args.max_memory,
+                               store_path=args.store, workers=args.workers, metrics=metrics,
+                               input_cache_dir=input_cache_dir,
+                               formats=[f.strip() for f in args.formats.split(",") if f.strip()])
+    print(status)
+    if metrics:
+        metrics.finish(status)
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            json.dump(metrics.to_dict(), f, indent=2, ensure_ascii=False)
+        print(f"📈 Run metrics saved to {args.metrics}")
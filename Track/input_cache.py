@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import hashlib
+import functools
+import pandas as pd
+import result_cache
+
+# --- Parsed-Input Cache ---
+# The frame parsed from an input file is kept on disk next to a fingerprint of
+# the file (path, size, mtime and content hash), so reruns over unchanged files
+# load it back instead of parsing the CSV again. An mtime change alone (a copy or
+# touch) costs a hash of the file, not a parse. Frames are pickled: they hold
+# the parser's own dtypes and mixed-type columns exactly as read. Loading a pickle
+# can run code, so the cache lives in a per-user folder (created private), never
+# next to the data where anyone who can write a depot folder could plant entries.
+
+CACHE_VERSION = 1
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "logifusion", "input_cache")
+
+@functools.lru_cache(maxsize=None)
+def cache_version(reader_path):
+    # Entries are only valid for the same reader code and pandas version
+    return f"{CACHE_VERSION}:{pd.__version__}:{result_cache.source_version([reader_path])}"
+
+def entry_paths(cache_dir, path):
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, key + ".json"), os.path.join(cache_dir, key + ".pkl")
+
+def lookup(cache_dir, path, version):
+    # The cached frame of path, or None if there is none or the file has changed
+    meta_path, frame_path = entry_paths(cache_dir, path)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != version or meta.get("size") != stat.st_size:
+        return None
+    if meta.get("mtime_ns") != stat.st_mtime_ns:
+        if meta.get("digest") != result_cache.file_digest(path=path):
+            return None
+        meta["mtime_ns"] = stat.st_mtime_ns
+        write_meta(meta_path, meta)
+    try:
+        return pd.read_pickle(frame_path)
+    except Exception:
+        return None
+
+def write_meta(meta_path, meta):
+    tmp = f"{meta_path}.tmp-{os.getpid()}-{time.time_ns()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+def store(cache_dir, path, df, version):
+    # Frame first, then its fingerprint, each renamed into place so a reader never
+    # pairs a fingerprint with a half-written frame
+    meta_path, frame_path = entry_paths(cache_dir, path)
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        stat = os.stat(path)
+        meta = {"file": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "digest": result_cache.file_digest(path=path), "version": version}
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        tmp = f"{frame_path}.tmp-{os.getpid()}-{time.time_ns()}"
+        df.to_pickle(tmp)
+        os.replace(tmp, frame_path)
+        write_meta(meta_path, meta)
+    except OSError:
+        return False
+    return True
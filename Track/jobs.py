@@ -0,0 +1,99 @@
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Background Jobs ---
+# A local worker pool for /run: submissions get a job ID straight away and the
+# pipeline runs on one of at most `max_workers` threads; callers poll the status.
+# run() executes a job in the calling thread instead, for hosts that freeze
+# background threads once the response is sent.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class JobQueue:
+    def __init__(self, max_workers=1, keep_finished=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="logifusion-job")
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _new_job(self, **fields):
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "stage": None,
+            "message": "",
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        job.update(fields)
+        with self.lock:
+            self._prune()
+            self.jobs[job["id"]] = job
+        return job["id"]
+
+    def _prune(self):
+        # Forget finished jobs after keep_finished seconds (caller holds the lock)
+        cutoff = time.time() - self.keep_finished
+        for job_id in [j["id"] for j in self.jobs.values()
+                       if j["finished_at"] is not None and j["finished_at"] < cutoff]:
+            del self.jobs[job_id]
+
+    def _execute(self, job_id, func, args):
+        # func(*args, progress) returns the status message, or (message, extra job fields);
+        # a "status" among the extra fields overrides the check of the message's ❌ prefix.
+        # progress(stage) reports the current stage
+        def progress(stage):
+            self._update(job_id, stage=stage)
+
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            result = func(*args, progress)
+            message, extra = result if isinstance(result, tuple) else (result, {})
+            extra = dict(extra)
+            status = extra.pop("status", DONE if not str(message).startswith("❌") else FAILED)
+            self._update(job_id, status=status, stage=None, message=message, finished_at=time.time(), **extra)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, error=f"Critical Error running script: {e}",
+                         finished_at=time.time())
+
+    def submit(self, func, *args, **fields):
+        # Queue func on the worker pool (see _execute) and return its job ID
+        job_id = self._new_job(**fields)
+        self.executor.submit(self._execute, job_id, func, args)
+        return job_id
+
+    def run(self, func, *args, **fields):
+        # Same as submit, but runs func in the calling thread and returns once it has finished
+        job_id = self._new_job(**fields)
+        self._execute(job_id, func, args)
+        return job_id
+
+    def add_finished(self, message, **fields):
+        # Record a job that needed no work (e.g. served from the result cache)
+        now = time.time()
+        return self._new_job(status=DONE, message=message, started_at=now, finished_at=now, **fields)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def active_ids(self):
+        with self.lock:
+            return {j["id"] for j in self.jobs.values() if j["status"] in (QUEUED, RUNNING)}
+
+    def latest(self, status=DONE):
+        # Most recently finished job with the given status
+        with self.lock:
+            matches = [j for j in self.jobs.values() if j["status"] == status]
+            return dict(max(matches, key=lambda j: j["finished_at"])) if matches else None
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# --- KPI Rollups ---
+# Count, mean, median and p90 of the deviation measures per driver, customer,
+# transporter and month. Computed as the last stage of a run and saved next to
+# the consolidated file, so summaries never re-aggregate the detail rows.
+
+KPI_DIMENSIONS = {
+    "driver": "Driver Name",
+    "customer": "Customer Name",
+    "transporter": "Transporter",
+    "month": "Month Name",
+}
+KPI_MEASURES = ["Km Deviation", "Departure Deviation Min", "Service Time At Customer", "Days In Route Deviation"]
+KPI_STATS = ["count", "mean", "median", "p90"]
+KPI_COLUMNS = ["dimension", "value", "measure"] + KPI_STATS
+KPI_NAME = "Final_Consolidated_KPIs.csv"
+
+def empty_kpis():
+    return pd.DataFrame({col: pd.Series(dtype=object if col in ("dimension", "value", "measure") else float)
+                         for col in KPI_COLUMNS}).astype({"count": int})
+
+def measure_values(df):
+    # Measures as plain floats (NaN for blanks)
+    return pd.DataFrame({m: pd.to_numeric(df[m], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+                         for m in KPI_MEASURES}, index=df.index)
+
+def order_kpis(table):
+    # Dimensions and measures in declaration order, groups by label
+    dimension_rank = {d: i for i, d in enumerate(KPI_DIMENSIONS)}
+    measure_rank = {m: i for i, m in enumerate(KPI_MEASURES)}
+    ordered = table.assign(_d=table["dimension"].map(dimension_rank), _m=table["measure"].map(measure_rank))
+    ordered = ordered.sort_values(["_d", "value", "_m"], kind="stable")
+    return ordered.drop(columns=["_d", "_m"]).reset_index(drop=True)
+
+def compute_kpis(df, groups=None):
+    # The rollup of df; groups ({dimension: labels}) limits it to those groups
+    values = measure_values(df)
+    parts = []
+    for dimension, col in KPI_DIMENSIONS.items():
+        keys = df[col].astype(object)
+        rows = keys.notna().to_numpy()
+        if groups is not None:
+            rows = rows & keys.isin(groups.get(dimension, ())).to_numpy()
+        if not rows.any():
+            continue
+        grouped = values[rows].groupby(keys[rows].astype(str))
+        stats = pd.concat({"count": grouped.count(), "mean": grouped.mean(),
+                           "median": grouped.median(), "p90": grouped.quantile(0.9)}, axis=1)
+        # (stat, measure) columns -> one row per group and measure
+        table = stats.stack(level=1, future_stack=True).rename_axis(["value", "measure"]).reset_index()
+        table.insert(0, "dimension", dimension)
+        parts.append(table[KPI_COLUMNS])
+    if not parts:
+        return empty_kpis()
+    return order_kpis(pd.concat(parts, ignore_index=True).astype({"count": int}))
+
+def affected_groups(*frames):
+    # {dimension: labels} of the loads in frames, e.g. a changed load's old and new record
+    groups = {dimension: set() for dimension in KPI_DIMENSIONS}
+    for df in frames:
+        for dimension, col in KPI_DIMENSIONS.items():
+            if col in df.columns:
+                groups[dimension].update(str(v) for v in df[col].dropna().astype(object))
+    return groups
+
+def kpi_inputs(df):
+    # Per load, the labels and measures its rows contribute to the rollup
+    labels = df[list(KPI_DIMENSIONS.values())].astype(object)
+    labels = labels.where(labels.notna(), None)
+    return pd.concat([df[["Load Number"]].astype(str), labels, measure_values(df)], axis=1)
+
+def input_digests(inputs):
+    # One hash per load of its labels and measures
+    values = kpi_inputs(inputs).drop(columns="Load Number")
+    digests = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return pd.Series(digests, index=inputs["Load Number"].astype(str).to_numpy())
+
+def changed_groups(previous, current):
+    # {dimension: labels} of loads that are new, gone, or changed a label or measure
+    # between two kpi_inputs tables, both before and after the change
+    digests = pd.concat({"old": input_digests(previous), "new": input_digests(current)}, axis=1)
+    changed = digests.index[digests["old"] != digests["new"]]
+    return affected_groups(previous[previous["Load Number"].isin(changed)],
+                           current[current["Load Number"].isin(changed)])
+
+def update_kpis(stored, df, groups):
+    # Recompute only the given groups over df (all loads) and keep the other stored rows
+    stale = np.zeros(len(stored), dtype=bool)
+    for dimension, labels in groups.items():
+        stale |= ((stored["dimension"] == dimension) & stored["value"].isin(labels)).to_numpy()
+    fresh = compute_kpis(df, groups)
+    kept = stored[~stale]
+    if kept.empty:
+        return fresh
+    return order_kpis(pd.concat([kept, fresh], ignore_index=True) if not fresh.empty else kept)
+
+def write_kpis(table, path):
+    table.round(4).to_csv(path, index=False)
+
+def read_kpis(path):
+    # Labels stay text (a driver may be called "NA"); only empty cells are missing
+    table = pd.read_csv(path, dtype={"dimension": str, "value": str, "measure": str},
+                        keep_default_na=False, na_values=[""])
+    return table.astype({"count": int})
@@ -0,0 +1,92 @@
+import json
+import numpy as np
+import pandas as pd
+from data_combiner import blank_text, DATETIME_OUTPUT_FORMAT
+
+# --- Load Index ---
+# In-memory indexes over one consolidated result for the /api/loads queries:
+# a hash index on Load Number, the rows in Create Date order for range scans,
+# and inverted indexes (case-insensitive) on driver, customer and vehicle.
+
+DATE_COLUMN = "Create Date"
+FILTER_COLUMNS = {"driver": "Driver Name", "customer": "Customer Name", "vehicle": "Vehicle Reg"}
+NO_ROWS = np.array([], dtype=np.intp)
+
+def normalise(value):
+    return str(value).strip().lower()
+
+def json_value(value):
+    # numpy scalars left in object columns
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+    return json.dumps(value, default=json_value, ensure_ascii=False)
+
+class LoadIndex:
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        rows = np.arange(len(self.df))
+
+        # Load Number -> row (loads are unique after consolidation)
+        self.by_load = dict(zip(blank_text(self.df["Load Number"]), rows))
+
+        # Rows in date order, undated last; rank is each row's place in that order
+        dates = self.df[DATE_COLUMN].to_numpy(dtype="datetime64[ns]")
+        self.date_order = np.argsort(dates, kind="stable")
+        self.sorted_dates = dates[self.date_order][:int((~np.isnat(dates)).sum())]
+        self.rank = np.empty(len(rows), dtype=np.intp)
+        self.rank[self.date_order] = rows
+
+        # value -> rows (ascending) per filter
+        self.inverted = {}
+        for key, col in FILTER_COLUMNS.items():
+            values = blank_text(self.df[col]).str.lower().to_numpy()
+            groups = pd.Series(rows).groupby(values).indices
+            self.inverted[key] = {value: positions for value, positions in groups.items() if value != ""}
+
+    def __len__(self):
+        return len(self.df)
+
+    def get(self, load_number):
+        row = self.by_load.get(str(load_number).strip())
+        return None if row is None else self.records([row])[0]
+
+    def query(self, start=None, end=None, **filters):
+        # Rows matching every given filter and start <= Create Date <= end, in date order
+        candidates = None
+        for key, value in filters.items():
+            if value is None:
+                continue
+            positions = self.inverted[key].get(normalise(value), NO_ROWS)
+            candidates = positions if candidates is None else np.intersect1d(candidates, positions, assume_unique=True)
+
+        if start is not None or end is not None:
+            lo = np.searchsorted(self.sorted_dates, np.datetime64(start, "ns"), "left") if start is not None else 0
+            hi = np.searchsorted(self.sorted_dates, np.datetime64(end, "ns"), "right") if end is not None else len(self.sorted_dates)
+            in_range = self.date_order[lo:hi]
+            if candidates is None:
+                return in_range
+            candidates = np.intersect1d(candidates, in_range, assume_unique=True)
+
+        if candidates is None:
+            return self.date_order
+        return candidates[np.argsort(self.rank[candidates], kind="stable")]
+
+    def records(self, positions):
+        # JSON-ready dicts; timestamps in the exports' layout, blanks as None
+        rows = self.df.iloc[positions].copy()
+        for col in rows.columns:
+            if pd.api.types.is_datetime64_any_dtype(rows[col]):
+                rows[col] = rows[col].dt.strftime(DATETIME_OUTPUT_FORMAT)
+        rows = rows.astype(object)
+        return rows.where(rows.notna(), None).to_dict("records")
+
+    def stream_page(self, positions, meta, batch=200):
+        # The page as JSON text, written out a batch of rows at a time
+        yield dumps(meta)[:-1] + ', "loads": ['
+        for start in range(0, len(positions), batch):
+            chunk = self.records(positions[start:start + batch])
+            yield ("," if start else "") + ",".join(dumps(row) for row in chunk)
+        yield "]}"
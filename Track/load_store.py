@@ -0,0 +1,104 @@
+import os
+import json
+import math
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# --- Persistent Consolidated Store ---
+# One SQLite file keyed by Load Number holding the consolidated record of every
+# load plus a digest of its rows in each source, so a rerun only has to
+# recompute loads whose input rows changed.
+
+STORE_VERSION = 2
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def open_store(path, columns, signature):
+    # Opens (or creates) the store; a different signature (columns, source order,
+    # main depot, store version) means the stored records are stale, so start empty.
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    signature = json.dumps({"version": STORE_VERSION, **signature}, sort_keys=True)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+    if row is None or row[0] != signature:
+        conn.execute("DROP TABLE IF EXISTS loads")
+        conn.execute("DROP TABLE IF EXISTS source_digests")
+        conn.execute("DROP TABLE IF EXISTS kpis")
+        conn.execute("DROP TABLE IF EXISTS kpi_inputs")
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+
+    # Untyped record columns keep ints, floats and text exactly as written
+    record_cols = ", ".join(quote(c) for c in columns if c != "Load Number")
+    conn.execute(f'CREATE TABLE IF NOT EXISTS loads ("Load Number" TEXT PRIMARY KEY, {record_cols})')
+    conn.execute("""CREATE TABLE IF NOT EXISTS source_digests (
+        load_number TEXT, source TEXT, digest TEXT, PRIMARY KEY (load_number, source))""")
+    conn.commit()
+    return conn
+
+def read_digests(conn):
+    return pd.read_sql_query("SELECT load_number, source, digest FROM source_digests", conn)
+
+def diff_digests(stored, current):
+    # Loads that are new or whose rows changed in any source, and loads that are gone
+    merged = stored.merge(current, on=["load_number", "source"], how="outer",
+                          suffixes=("_old", "_new"))
+    changed = merged.loc[merged["digest_old"] != merged["digest_new"], "load_number"]
+    current_loads = set(current["load_number"])
+    removed = set(stored["load_number"]) - current_loads
+    return set(changed) - removed, removed
+
+def to_sql_value(value):
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def save_loads(conn, records, digests, removed):
+    # Replace the records and digests of the recomputed loads, drop removed loads
+    columns = list(records.columns)
+    placeholders = ", ".join("?" for _ in columns)
+    rows = [[to_sql_value(v) for v in row] for row in records.itertuples(index=False, name=None)]
+    stale = list(removed) + list(digests["load_number"].unique())
+
+    with conn:
+        conn.executemany("DELETE FROM loads WHERE \"Load Number\" = ?", [(l,) for l in removed])
+        conn.executemany("DELETE FROM source_digests WHERE load_number = ?", [(l,) for l in stale])
+        conn.executemany(f"INSERT OR REPLACE INTO loads ({', '.join(quote(c) for c in columns)}) VALUES ({placeholders})", rows)
+        conn.executemany("INSERT INTO source_digests VALUES (?, ?, ?)",
+                         digests[["load_number", "source", "digest"]].itertuples(index=False, name=None))
+
+def read_table(conn, name, columns):
+    # A whole-table snapshot (e.g. the KPI rollup), or None if this store has none yet
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is None:
+        return None
+    cursor = conn.execute(f"SELECT {', '.join(quote(c) for c in columns)} FROM {quote(name)}")
+    return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+def save_table(conn, name, table):
+    # Replace a whole-table snapshot
+    columns = list(table.columns)
+    rows = [[to_sql_value(v) for v in row] for row in table.itertuples(index=False, name=None)]
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {quote(name)}")
+        conn.execute(f"CREATE TABLE {quote(name)} ({', '.join(quote(c) for c in columns)})")
+        conn.executemany(f"INSERT INTO {quote(name)} VALUES ({', '.join('?' for _ in columns)})", rows)
+
+def read_loads(conn, columns, datetime_columns=()):
+    cursor = conn.execute(f"SELECT {', '.join(quote(c) for c in columns)} FROM loads ORDER BY \"Load Number\"")
+    df = pd.DataFrame(cursor.fetchall(), columns=columns, dtype=object)
+    for col in columns:
+        if col in datetime_columns:
+            df[col] = pd.to_datetime(df[col], format='ISO8601').astype('datetime64[ns]')
+        else:
+            df[col] = df[col].fillna("")
+    return df
@@ -0,0 +1,123 @@
+import os
+import stat
+import time
+import shutil
+import hashlib
+
+# --- Content-Addressed Result Cache ---
+# Results of a run are stored under a key derived from the input file contents
+# and the pipeline version, so resubmitting the same files is answered from disk.
+# Entries are evicted least-recently-used first once the cache is too big or old.
+
+STATUS_FILE = "status.txt"
+
+def private_dir(path):
+    # Create path (mode 0700) and check it is a real folder of this user that no one
+    # else can write to; a folder another local user made first could swap files under us
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    foreign = hasattr(os, "getuid") and info.st_uid != os.getuid()
+    if not stat.S_ISDIR(info.st_mode) or foreign or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} must be a folder owned by this user and writable only by it")
+    return path
+
+def file_digest(data=None, path=None):
+    # sha256 of in-memory bytes or of a file on disk (read in blocks)
+    h = hashlib.sha256()
+    if data is not None:
+        h.update(data)
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+    return h.hexdigest()
+
+def source_version(paths):
+    # Version of the code that produced a result: changes whenever any of the files do
+    h = hashlib.sha256()
+    for path in sorted(paths):
+        h.update(os.path.basename(path).encode())
+        h.update(file_digest(path=path).encode())
+    return h.hexdigest()
+
+def cache_key(input_digests, version):
+    # input_digests: input name -> digest (None for inputs that are absent)
+    h = hashlib.sha256(version.encode())
+    for name in sorted(input_digests):
+        h.update(f"{name}={input_digests[name] or '-'};".encode())
+    return h.hexdigest()
+
+def lookup(cache_dir, key):
+    # Returns (entry dir, status) on a hit, refreshing the entry for LRU
+    entry = os.path.join(private_dir(cache_dir), key)
+    status_path = os.path.join(entry, STATUS_FILE)
+    if not os.path.exists(status_path):
+        return None, None
+    now = time.time()
+    os.utime(entry, (now, now))
+    with open(status_path, encoding='utf-8') as f:
+        return entry, f.read()
+
+def store(cache_dir, key, output_paths, status):
+    # Copy outputs into a temp dir and rename it into place so readers never see half an entry
+    entry = os.path.join(private_dir(cache_dir), key)
+    tmp = f"{entry}.tmp-{os.getpid()}-{time.time_ns()}"
+    os.makedirs(tmp)
+    try:
+        for path in output_paths:
+            if os.path.exists(path):
+                shutil.copy2(path, os.path.join(tmp, os.path.basename(path)))
+        with open(os.path.join(tmp, STATUS_FILE), 'w', encoding='utf-8') as f:
+            f.write(status)
+        if os.path.exists(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return None
+    return entry
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def evict(cache_dir, max_bytes=None, max_age=None, keep=()):
+    # Drop entries older than max_age seconds, then least recently used until under max_bytes.
+    # Entries named in keep are never removed, but their size counts towards max_bytes.
+    if not os.path.isdir(cache_dir):
+        return 0
+    now = time.time()
+    entries = []
+    kept_bytes = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path):
+            continue
+        if name in keep:
+            kept_bytes += dir_size(path)
+        else:
+            entries.append((os.path.getmtime(path), dir_size(path), path))
+
+    removed = 0
+    kept = []
+    for mtime, size, path in sorted(entries):
+        if max_age is not None and now - mtime > max_age:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        else:
+            kept.append((mtime, size, path))
+
+    total = sum(size for _, size, _ in kept) + kept_bytes
+    for mtime, size, path in kept:
+        if max_bytes is None or total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
@@ -0,0 +1,152 @@
+import sys
+import json
+import time
+import logging
+import statistics
+
+# --- Run Metrics ---
+# Structured per-stage instrumentation for process_data_func: wall time, rows in
+# and out, memory, and how many missing values each smart fill managed to fill.
+# Pass a RunMetrics as `metrics`; it is filled in as the run goes.
+
+logger = logging.getLogger("logifusion.metrics")
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def rounded(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+class RunMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.status = None
+        self.stages = []
+        self.fills = {}
+
+    def observe(self, progress=None):
+        # Progress callback that opens a new stage, then tells the caller's observer
+        def callback(stage):
+            self.start(stage)
+            if progress:
+                progress(stage)
+        return callback
+
+    def start(self, stage):
+        now = time.perf_counter()
+        previous = self._close(now)
+        self.stages.append({
+            "stage": stage,
+            "started": now,
+            "seconds": None,
+            # By default a stage consumes what the previous one produced
+            "rows_in": previous["rows_out"] if previous else None,
+            "rows_out": None,
+            "frame_mb": None,
+            "peak_rss_mb": None,
+        })
+
+    def _close(self, now):
+        if not self.stages:
+            return None
+        current = self.stages[-1]
+        if current["seconds"] is None:
+            current["seconds"] = now - current["started"]
+            current["peak_rss_mb"] = peak_rss_mb()
+        return current
+
+    def record(self, rows_in=None, rows_out=None, frame_mb=None):
+        # Row counts and working-frame size for the running stage
+        if not self.stages:
+            return
+        current = self.stages[-1]
+        for key, value in (("rows_in", rows_in), ("rows_out", rows_out), ("frame_mb", frame_mb)):
+            if value is not None:
+                current[key] = value
+
+    def fill(self, name, missing, filled):
+        # A smart fill found `filled` of `missing` blank values (summed over calls)
+        entry = self.fills.setdefault(name, {"missing": 0, "filled": 0})
+        entry["missing"] += int(missing)
+        entry["filled"] += int(filled)
+
+    def finish(self, status=None):
+        self.finished = time.perf_counter()
+        self._close(self.finished)
+        self.status = status
+
+    def to_dict(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        rss = peak_rss_mb()
+        return {
+            "status": self.status,
+            "ok": bool(self.status) and str(self.status).startswith("✅"),
+            "total_seconds": rounded(end - self.started),
+            "peak_rss_mb": rounded(rss, 1),
+            "stages": [{
+                "stage": s["stage"],
+                "seconds": rounded(s["seconds"]),
+                "rows_in": s["rows_in"],
+                "rows_out": s["rows_out"],
+                "frame_mb": rounded(s["frame_mb"], 1),
+                "peak_rss_mb": rounded(s["peak_rss_mb"], 1),
+            } for s in self.stages],
+            "fills": {name: {**counts, "hit_rate": hit_rate(counts)} for name, counts in self.fills.items()},
+        }
+
+    def log(self, **context):
+        # One JSON line per run on the logifusion.metrics logger
+        logger.info(json.dumps({**context, **self.to_dict()}, ensure_ascii=False))
+
+def hit_rate(counts):
+    return round(counts["filled"] / counts["missing"], 4) if counts["missing"] else None
+
+def record(metrics, **fields):
+    if metrics:
+        metrics.record(**fields)
+
+def record_fill(metrics, name, missing, filled):
+    if metrics:
+        metrics.fill(name, missing, filled)
+
+def summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"mean": rounded(statistics.fmean(values)), "p50": rounded(statistics.median(values)),
+            "max": rounded(max(values))}
+
+def aggregate(runs):
+    # Roll a list of RunMetrics.to_dict() results up for the /metrics endpoint;
+    # runs served from the result cache only count as cache hits
+    computed = [run for run in runs if not run.get("cached")]
+    stages, fills = {}, {}
+    for run in computed:
+        for s in run["stages"]:
+            stages.setdefault(s["stage"], []).append(s)
+        for name, counts in run["fills"].items():
+            total = fills.setdefault(name, {"missing": 0, "filled": 0})
+            total["missing"] += counts["missing"]
+            total["filled"] += counts["filled"]
+    return {
+        "runs": len(runs),
+        "cache_hits": len(runs) - len(computed),
+        "failed": sum(1 for run in computed if not run["ok"]),
+        "total_seconds": summary(run["total_seconds"] for run in computed),
+        "peak_rss_mb": summary(run["peak_rss_mb"] for run in computed),
+        "stages": {stage: {
+            "runs": len(entries),
+            "seconds": summary(s["seconds"] for s in entries),
+            "rows_out": summary(s["rows_out"] for s in entries),
+            "peak_rss_mb": summary(s["peak_rss_mb"] for s in entries),
+        } for stage, entries in stages.items()},
+        "fills": {name: {**counts, "hit_rate": hit_rate(counts)} for name, counts in fills.items()},
+    }
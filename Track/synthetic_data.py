@@ -0,0 +1,250 @@
+import os
+import csv
+import codecs
+import argparse
+import numpy as np
+import pandas as pd
+from data_combiner import SOURCE_FILES
+
+# --- Synthetic Exports ---
+# Generates the five input files at any size, shaped like the real exports:
+# same headers, delimiters, BOMs and date layouts, and the same overlap of Load
+# Numbers between files (measured on the sample data in this folder).
+
+# Which files a load appears in, with the share of loads seen in the sample
+JOIN_PATTERNS = [
+    (("Depot", "Customer", "Distance", "Timestamps", "TimeRoute"), 0.391),
+    (("Customer", "Timestamps"), 0.315),
+    (("TimeRoute",), 0.275),
+    (("Depot", "Customer", "Timestamps", "TimeRoute"), 0.014),
+    (("Depot", "TimeRoute"), 0.003),
+    (("Customer",), 0.001),
+    (("Depot", "Customer", "Distance", "TimeRoute"), 0.001),
+]
+
+# Extra rows per load (split deliveries, re-dispatches)
+DUPLICATE_RATES = {"Depot": 0.07, "Customer": 0.02, "Distance": 0.016, "Timestamps": 0.004, "TimeRoute": 0.035}
+
+FIRST_NAMES = ["Moses", "George", "Ronald", "Swaibu", "Badiru", "Francisco", "Faluku", "David", "Leonard",
+               "Mesulamu", "Robert", "Isaac", "Joseph", "Peter", "Charles", "Emmanuel", "Patrick", "Samuel"]
+LAST_NAMES = ["Mugisha", "Kabanda", "Kanyerre", "Wanda", "Mulondo", "Ssenjako", "Agunda", "Masaba", "Waiswa",
+              "Okello", "Mukasa", "Ouma", "Wasswa", "Kato", "Byaruhanga", "Tumusiime", "Nsubuga"]
+TOWNS = ["Mukono", "Gulu", "Mbale", "Bugiri", "Arua", "Lira", "Nabingo", "Jinja", "Masaka", "Tororo", "Soroti",
+         "Kampala", "Iganga", "Hoima", "Mbarara"]
+COMPANIES = ["Sagar Trading Company Limited", "Tan Distributors Ltd", "Kachain Logistics Ltd",
+             "Lira Resort Enterprises", "Nakuya Enterprises Ltd", "Sawan Distributors Ltd",
+             "Blue Nile Distributors", "Mukwano Traders", "Victoria Wholesalers Ltd", "Equator Supplies"]
+
+def load_names(n, first=0):
+    # BM + base-36 counter + RR, e.g. BM00A1ZRR
+    digits = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    values = np.arange(first, first + n)
+    parts = []
+    for _ in range(7):
+        parts.append(digits[values % 36])
+        values = values // 36
+    body = pd.Series(["".join(chars) for chars in zip(*reversed(parts))])
+    return "BM" + body + "RR"
+
+def name_pool(rng, size, build):
+    return np.array(list(dict.fromkeys(build(rng) for _ in range(size * 3)))[:size])
+
+def customers(rng, size):
+    def build(r):
+        tax = 1000000000 + int(r.integers(0, 9999999))
+        return f"{r.choice(COMPANIES)}-{r.choice(TOWNS)} Tax No.: {tax}"
+    return name_pool(rng, size, build)
+
+def drivers(rng, size):
+    def build(r):
+        name = f"{r.choice(FIRST_NAMES)} {r.choice(LAST_NAMES)}"
+        return name.upper() if r.random() < 0.3 else name
+    return name_pool(rng, size, build)
+
+def vehicles(rng, size):
+    def build(r):
+        return f"UB{chr(65 + int(r.integers(0, 26)))} {int(r.integers(100, 999))}{chr(65 + int(r.integers(0, 26)))}"
+    return name_pool(rng, size, build)
+
+def format_times(times, fmt, unpadded_share=0.0, rng=None):
+    # dd/mm/yyyy hh:mm text; a share of rows drops the leading zeros (1/7/2025 0:00) like the Depot export
+    text = pd.Series(times).dt.strftime(fmt)
+    if unpadded_share:
+        times = pd.Series(times)
+        part = lambda values: values.astype('Int64').astype(str)
+        loose = (part(times.dt.day) + "/" + part(times.dt.month) + "/" + part(times.dt.year)
+                 + " " + part(times.dt.hour) + ":" + times.dt.strftime("%M"))
+        text = text.where(rng.random(len(text)) >= unpadded_share, loose)
+    return text.where(pd.Series(times).notna(), "")
+
+def with_duplicates(rng, rows, rate):
+    # Repeat a share of the rows, keeping them next to the original
+    extra = rng.random(len(rows)) < rate
+    index = np.sort(np.concatenate([np.arange(len(rows)), np.flatnonzero(extra)]))
+    return rows.iloc[index].reset_index(drop=True)
+
+def blank_some(rng, values, share):
+    values = pd.Series(values).astype(object)
+    return values.where(rng.random(len(values)) >= share, "")
+
+def generate(out_dir, loads, seed=0, start="2025-01-01", days=210, depot_name="Jinja", first_load=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 1. Loads and their shared attributes
+    n = loads
+    base = pd.DataFrame({
+        "load": load_names(n, first_load),
+        "schedule": pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, n), unit="D"),
+        "driver": rng.choice(drivers(rng, max(10, min(400, n // 30))), n),
+        "vehicle": rng.choice(vehicles(rng, max(10, min(300, n // 50))), n),
+        "customer": rng.choice(customers(rng, max(10, min(500, n // 60))), n),
+        "transporter": np.where(rng.random(n) < 0.6, "Own", "Hired"),
+        "order": pd.Series(rng.choice(list("UNERB"), n)) + pd.Series(rng.integers(0, 99999, n)).astype(str).str.zfill(5),
+    })
+    shares = np.array([share for _, share in JOIN_PATTERNS])
+    pattern = rng.choice(len(JOIN_PATTERNS), n, p=shares / shares.sum())
+    present = {name: np.isin(pattern, [i for i, (names, _) in enumerate(JOIN_PATTERNS) if name in names])
+               for name in SOURCE_FILES}
+    in_depot, in_distance, in_route = present["Depot"], present["Distance"], present["TimeRoute"]
+    in_customer, in_stamps = present["Customer"], present["Timestamps"]
+
+    # Route timeline (minutes after the schedule date)
+    planned = base["schedule"] + pd.to_timedelta(rng.integers(-600, 1200, n), unit="min")
+    departure = planned + pd.to_timedelta(rng.normal(60, 300, n).round(), unit="min")
+    arrival = departure + pd.to_timedelta(rng.integers(60, 1440, n), unit="min")
+    service = rng.gamma(1.5, 150, n).round().astype(int)
+    offloading = arrival + pd.to_timedelta(service, unit="min")
+    route = rng.integers(300, 6000, n)
+    back_at_depot = departure + pd.to_timedelta(route, unit="min")
+    clockin = departure - pd.to_timedelta(rng.integers(5, 240, n), unit="min")
+
+    # 2. Depot departures: tab separated, no BOM, partly unpadded dates
+    depot = base[in_depot]
+    idx = np.flatnonzero(in_depot)
+    frame = pd.DataFrame({
+        "Schedule Date": format_times(depot["schedule"].to_numpy(), "%d/%m/%Y %H:%M", 0.3, rng),
+        "Depot": depot_name,
+        "Load Name": depot["load"].to_numpy(),
+        "Driver Name": blank_some(rng, depot["driver"].to_numpy(), 0.02),
+        "Vehicle Reg": depot["vehicle"].to_numpy(),
+        "Planned Departure Time": format_times(planned[idx].to_numpy(), "%d/%m/%Y %H:%M"),
+        "DJ Departure Time": format_times(departure[idx].to_numpy(), "%d/%m/%Y %H:%M", 0.3, rng),
+        "Departure Time Difference (DJ vs Planned)": ((departure[idx] - planned[idx]).dt.total_seconds() // 60).astype(int).to_numpy(),
+        "Hired/Own": depot["transporter"].to_numpy(),
+    })
+    write(with_duplicates(rng, frame, DUPLICATE_RATES["Depot"]), out_dir, "Depot", sep="\t", bom=False)
+
+    # 3. Customer timestamps
+    idx = np.flatnonzero(in_customer)
+    cust = base.iloc[idx]
+    invoiced = offloading[idx] + pd.to_timedelta(rng.integers(0, 180, len(idx)), unit="min")
+    frame = pd.DataFrame({
+        "schedule_date": format_times(cust["schedule"].to_numpy(), "%d/%m/%Y %H:%M"),
+        "Depot": depot_name,
+        "load_name": cust["load"].to_numpy(),
+        "sales_order_number": cust["order"].to_numpy(),
+        "customer_name": cust["customer"].to_numpy(),
+        "DriverName": blank_some(rng, cust["driver"].to_numpy(), 0.12),
+        "ArrivedAtCustomer(Odo)": format_times(arrival[idx].to_numpy(), "%d/%m/%Y %H:%M"),
+        "Offloading": format_times(offloading[idx].to_numpy(), "%d/%m/%Y %H:%M"),
+        "Invoiced": format_times(invoiced.to_numpy(), "%d/%m/%Y %H:%M"),
+        "Total Time Spent @ Customer": service[idx],
+        "Customer Gate To Offloading": rng.integers(0, 30, len(idx)),
+        "Offloading to Invoice Completion": ((invoiced - offloading[idx]).dt.total_seconds() // 60).astype(int).to_numpy(),
+    })
+    write(with_duplicates(rng, frame, DUPLICATE_RATES["Customer"]), out_dir, "Customer")
+
+    # 4. Distance information: every field quoted, ISO dates
+    idx = np.flatnonzero(in_distance)
+    dist = base.iloc[idx]
+    to_customer = rng.gamma(1.2, 140, len(idx)).round(1)
+    planned_km = (to_customer * 2).round(1)
+    actual_km = (planned_km * rng.normal(1.05, 0.08, len(idx))).round().astype(int)
+    odometer = rng.integers(10000, 400000, len(idx))
+    frame = pd.DataFrame({
+        "Schedule Date": dist["schedule"].dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy(),
+        "Depot": depot_name,
+        "Load Name": dist["load"].to_numpy(),
+        "Driver Name": blank_some(rng, dist["driver"].to_numpy(), 0.02),
+        "Vehicle Reg": dist["vehicle"].to_numpy(),
+        "Sales Order": dist["order"].to_numpy(),
+        "Customer": dist["customer"].to_numpy(),
+        "Depot Departure Odometer": odometer,
+        "Navigate To Customer Odometer": odometer,
+        "Arrived at Customer Odometer": odometer + (actual_km // 2),
+        "Arrived At Depot Odometer": odometer + actual_km,
+        "PlannedDistanceToCustomer": to_customer,
+        "Trip Odometer Difference": actual_km // 2,
+        "Planned Load Distance": planned_km,
+        "Total DJ Distance for Load": actual_km,
+        "Distance Difference (Planned vs DJ)": (actual_km - planned_km).round(1),
+        "Load Distance Difference (Planned vs. DJ)": (actual_km - planned_km).round(1),
+        "Hired/Own": dist["transporter"].to_numpy(),
+    })
+    write(with_duplicates(rng, frame, DUPLICATE_RATES["Distance"]), out_dir, "Distance",
+          quoting=csv.QUOTE_NONNUMERIC)
+
+    # 5. Timestamps and duration
+    idx = np.flatnonzero(in_stamps)
+    stamps = base.iloc[idx]
+    gate = clockin[idx] + pd.to_timedelta(rng.integers(2, 30, len(idx)), unit="min")
+    arrive = pd.Series(back_at_depot[idx].to_numpy()).where(rng.random(len(idx)) >= 0.03)
+    gate_entry = arrive + pd.to_timedelta(rng.integers(5, 60, len(idx)), unit="min")
+    completed = gate_entry.where(rng.random(len(idx)) >= 0.5) + pd.to_timedelta(rng.integers(10, 600, len(idx)), unit="min")
+    frame = pd.DataFrame({
+        "schedule_date": format_times(stamps["schedule"].to_numpy(), "%d/%m/%Y %H:%M"),
+        "Depot": depot_name,
+        "load_name": stamps["load"].to_numpy(),
+        "Load StartTime (Pre-Trip Start)": format_times(clockin[idx].to_numpy(), "%d/%m/%Y %H:%M"),
+        "GateManifestTime": format_times(gate.to_numpy(), "%d/%m/%Y %H:%M"),
+        "Load Start to Gate Exit": ((gate - clockin[idx]).dt.total_seconds() // 60).astype(int).to_numpy(),
+        "ArriveAtDepot(Odo)": format_times(arrive.to_numpy(), "%d/%m/%Y %H:%M"),
+        "GateEntryCompletion": format_times(gate_entry.to_numpy(), "%d/%m/%Y %H:%M"),
+        "Depot Arrival to Gate Entry Complete": ((gate_entry - arrive).dt.total_seconds() // 60).to_numpy(),
+        "FullsWarehouseComplete": format_times(gate_entry.to_numpy(), "%d/%m/%Y %H:%M"),
+        "EmptiesWarehouseComplete": format_times(gate_entry.to_numpy(), "%d/%m/%Y %H:%M"),
+        "LoadCompleted": format_times(completed.to_numpy(), "%d/%m/%Y %H:%M"),
+        "Gate Entry to load Completion": ((completed - gate_entry).dt.total_seconds() // 60).to_numpy(),
+    })
+    write(with_duplicates(rng, frame, DUPLICATE_RATES["Timestamps"]), out_dir, "Timestamps")
+
+    # 6. Time in route
+    idx = np.flatnonzero(in_route)
+    tir = base.iloc[idx]
+    planned_route = rng.integers(200, 3000, len(idx))
+    actual_route = pd.Series(route[idx]).where(rng.random(len(idx)) >= 0.03).to_numpy()
+    frame = pd.DataFrame({
+        "Schedule Date": format_times(tir["schedule"].to_numpy(), "%d/%m/%Y %H:%M"),
+        "Depot Code": np.where(rng.random(len(idx)) < 0.6, "B", "O"),
+        "Load": tir["load"].to_numpy(),
+        "Sales Order": tir["order"].to_numpy(),
+        "Driver": tir["driver"].str.upper().to_numpy(),
+        "Customer": tir["customer"].to_numpy(),
+        "Time in Route (min)": actual_route,
+        "Planned Time in Route (min)": planned_route,
+        "Time In Route Difference ( DJ - Planned)": actual_route - planned_route,
+    })
+    write(with_duplicates(rng, frame, DUPLICATE_RATES["TimeRoute"]), out_dir, "TimeRoute")
+
+    return {name: os.path.join(out_dir, filename) for name, filename in SOURCE_FILES.items()}
+
+def write(frame, out_dir, name, sep=",", bom=True, quoting=csv.QUOTE_MINIMAL):
+    path = os.path.join(out_dir, SOURCE_FILES[name])
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if bom:
+            f.write(codecs.BOM_UTF8.decode("utf-8"))
+        frame.to_csv(f, sep=sep, index=False, quoting=quoting)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic versions of the five input files.")
+    parser.add_argument("out_dir", help="folder to write the CSV files to")
+    parser.add_argument("--loads", type=int, default=10000, help="number of distinct load numbers (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("--depot", default="Jinja", help="depot name in the Depot columns (default: %(default)s)")
+    parser.add_argument("--first-load", type=int, default=0,
+                        help="counter of the first load number, to keep several depots' loads apart")
+    args = parser.parse_args()
+    paths = generate(args.out_dir, args.loads, seed=args.seed, depot_name=args.depot, first_load=args.first_load)
+    print(f"✅ Wrote {args.loads} loads to {args.out_dir}: {', '.join(os.path.basename(p) for p in paths.values())}")
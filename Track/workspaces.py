@@ -0,0 +1,25 @@
+import os
+import uuid
+import result_cache
+
+# --- Per-Run Workspaces ---
+# Every run gets its own directory for its inputs and outputs, so concurrent
+# runs never share file names. Old workspaces are removed by age and total size.
+
+def create_workspace(root, run_id=None):
+    run_id = run_id or uuid.uuid4().hex
+    path = os.path.join(result_cache.private_dir(root), run_id)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return run_id, path
+
+def workspace_path(root, run_id):
+    # Only plain IDs map to a workspace; anything path-like is rejected
+    if not run_id or os.path.basename(run_id) != run_id or run_id in ('.', '..'):
+        return None
+    path = os.path.join(root, run_id)
+    return path if os.path.isdir(path) else None
+
+def cleanup_workspaces(root, max_age=None, max_bytes=None, keep=()):
+    # Remove workspaces older than max_age seconds, then the oldest ones until the
+    # rest fit in max_bytes. Workspaces listed in keep (active runs) are never touched.
+    return result_cache.evict(root, max_bytes, max_age, keep)